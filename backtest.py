@@ -0,0 +1,322 @@
+import argparse
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from db_store import connect_readonly
+from fetch_engine import FetchEngine
+from fundamentals_cache import load_fundamentals
+from price_store import LOOKBACK_DAYS, apply_download, download_prices, get_price_conn, load_panel
+from providers import ReplayProvider
+from rating_engine import (AD_GRADES, AD_WINDOW, MA200_RISING_LAG, MA_WINDOWS, MIN_HISTORY, RS_ANCHORS, YEAR_BARS,
+                           trend_template)
+from security_master import load_universe
+
+# 리밸런싱 간격(거래일)과 기본 보유 기간
+REBALANCE_DAYS = 21
+# 거래정지 등으로 빠진 봉은 이 일수까지만 직전 종가로 채움 (그 이상은 상장 폐지/장기 정지로 보고 제외)
+FFILL_LIMIT = 5
+GRADES = 'ABCDE'
+# 대시보드 기본 스크린 (dashboard.py 의 필터 초기값)
+DASHBOARD_SCREEN = {'min_price': 10.0, 'rs_min': 80, 'ind_rs_min': 50, 'smr': 'AB', 'ad': 'ABC', 'tt_only': False}
+DEFAULT_GRID = {
+    'min_price': [5.0, 10.0, 20.0],
+    'rs_min': [70, 80, 90],
+    'ind_rs_min': [0, 50, 70],
+    'smr': ['AB', 'ABC', 'ABCDE'],
+    'ad': ['AB', 'ABC', 'ABCDE'],
+    'tt_only': [False, True],
+}
+
+
+def _row_rank(values, pct=True):
+    """(날짜 x 종목) 배열의 행별 평균 순위 (NaN 제외) - pandas 의 C 구현을 행 단위로 한 번에 사용"""
+    return pd.DataFrame(values).rank(axis=1, pct=pct).to_numpy()
+
+
+def _window_sum(per_bar, rows, window):
+    """per_bar 의 누적합으로 각 rows 시점까지 window 봉 합계"""
+    cs = np.vstack([np.zeros((1, per_bar.shape[1])), np.cumsum(per_bar, axis=0)])
+    return cs[rows + 1] - cs[np.maximum(rows + 1 - window, 0)]
+
+
+def compute_features(close, volume, sectors, fundamentals, step=REBALANCE_DAYS, horizon=None):
+    """
+    일간 배치(update_data.process_chunk / rank_results)의 등급 공식을 모든 리밸런싱 날짜에 한 번에 적용합니다.
+    날짜 루프 없이 (리밸런싱 날짜 x 종목) 배열로 계산합니다.
+    - rs_raw / rs_score: 3·6·9개월 전 종가와 1년 구간 첫 종가 기준, 날짜별 전 종목 백분위
+    - ad: 최근 65봉 상승일/하락일 거래량 비율 등급
+    - smr: ROE / 이익률 / 매출 성장률 백분위 합의 5분위 (재무는 저장된 최신 값만 있어 전 기간 고정)
+    - ind_rs: 섹터 평균 rs_score 의 백분위
+    - tt: 미너비니 트렌드 템플릿 통과 여부
+    - fwd: 보유 기간(horizon 거래일, 기본 step) 수익률
+    일간 배치는 종목별 유효 봉을 아래로 모아 계산하지만 여기서는 날짜 위치를 맞춰야 하므로
+    FFILL_LIMIT 일 이하의 결측만 직전 종가로 채웁니다.
+    sectors / fundamentals: {symbol: sector}, {symbol: {'roe', 'margin', 'sales_growth'}}
+    """
+    horizon = horizon or step
+    symbols = close.columns
+    volume = volume.reindex(index=close.index, columns=symbols)
+    raw = close.to_numpy(dtype=float)
+    has_bar = ~np.isnan(raw) & ~np.isnan(volume.to_numpy(dtype=float))
+    c = close.ffill(limit=FFILL_LIMIT).to_numpy(dtype=float)
+    v = np.nan_to_num(volume.to_numpy(dtype=float))
+    n_rows, n_cols = c.shape
+    # 1년 구간은 일간 배치(load_panel)와 같은 달력일 기준
+    window_start = close.index.searchsorted(close.index - pd.Timedelta(days=LOOKBACK_DAYS))
+    rows = np.arange(n_rows - horizon)[::-1][::step][::-1]
+    rows = rows[close.index[rows] - pd.Timedelta(days=LOOKBACK_DAYS) >= close.index[0]]
+    if len(rows) == 0:
+        raise ValueError(f"가격 이력이 부족합니다 ({n_rows}봉, 최소 1년 + {horizon}봉). --backfill 로 긴 이력을 먼저 수집하세요")
+    start = window_start[rows]
+
+    # rs_raw: close[-k] 는 k-1 봉 전, 1년 구간 첫 종가는 구간 안의 첫 유효 봉 (rating_engine.rs_raw_from_panel)
+    cs = np.vstack([np.zeros((1, n_cols)), np.cumsum(has_bar, axis=0)])
+    counts = cs[rows + 1] - cs[start]
+    price = c[rows]
+    next_bar = pd.DataFrame(np.where(has_bar, np.arange(n_rows)[:, None], np.nan)).bfill().to_numpy()
+    first_idx = next_bar[start]
+    first = raw[np.nan_to_num(first_idx, nan=0).astype(int), np.arange(n_cols)]
+    first = np.where(np.isnan(first_idx), np.nan, first)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs_raw = price / c[rows - (RS_ANCHORS[0] - 1)] * 2
+        for k in RS_ANCHORS[1:]:
+            rs_raw = rs_raw + price / c[rows - (k - 1)]
+        rs_raw = rs_raw + price / first
+    valid = (counts >= max(MIN_HISTORY, max(RS_ANCHORS))) & np.isfinite(rs_raw) & ~np.isnan(price)
+    rs_raw = np.where(valid, rs_raw, np.nan)
+    rs_score = np.nan_to_num(_row_rank(rs_raw) * 98 + 1).astype(int)
+
+    # AD: 최근 AD_WINDOW 봉의 AD_WINDOW - 1 개 변화
+    change = np.vstack([np.zeros((1, n_cols)), np.nan_to_num(np.diff(c, axis=0))])
+    up = _window_sum(np.where(change > 0, v, 0), rows, AD_WINDOW - 1)
+    down = _window_sum(np.where(change < 0, v, 0), rows, AD_WINDOW - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(down > 0, up / down, np.nan)
+    ad = np.select([ratio >= t for t, _ in AD_GRADES], [GRADES.index(g) for _, g in AD_GRADES], GRADES.index('E'))
+    ad = np.where(np.isnan(ratio) | (counts < 20), GRADES.index('C'), ad)
+
+    # SMR: 백분위 합의 순위(동순위는 종목 순서)로 pd.qcut(.., 5) 와 같은 5분위
+    def masked(key):
+        values = np.array([(fundamentals.get(s) or {}).get(key) or 0 for s in symbols], dtype=float)
+        return np.where(valid, values[None, :], np.nan)
+    smr_val = _row_rank(masked('roe')) + _row_rank(masked('margin')) + _row_rank(masked('sales_growth'))
+    order = pd.DataFrame(smr_val).rank(axis=1, method='first').to_numpy()
+    n_valid = valid.sum(axis=1)[:, None]
+    edges = 1 + (n_valid[:, :, None] - 1) * np.arange(1, 5) / 5
+    quintile = (order[:, :, None] > edges).sum(axis=2)  # 0 = E ... 4 = A
+    smr = np.where(valid, 4 - quintile, GRADES.index('E'))
+
+    # 산업군 RS: 섹터별 평균 rs_score 의 백분위
+    codes, names = pd.factorize(pd.Series([sectors.get(s) or 'Unknown' for s in symbols]))
+    onehot = np.zeros((n_cols, len(names)))
+    onehot[np.arange(n_cols), codes] = 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sector_avg = (np.where(valid, rs_score, 0) @ onehot) / (valid @ onehot)
+    ind_rs = np.nan_to_num(_row_rank(sector_avg) * 98 + 1).astype(int)[:, codes]
+
+    # 트렌드 템플릿: 이동평균/52주 고저를 패널 전체에 rolling 으로 계산 후 리밸런싱 날짜만 사용
+    cf = pd.DataFrame(c)
+    trend = {'price': price, 'rs_score': rs_score}
+    for w in MA_WINDOWS:
+        trend[f'ma{w}'] = cf.rolling(w).mean().to_numpy()[rows]
+    trend['ma200_1m'] = cf.rolling(200).mean().shift(MA200_RISING_LAG).to_numpy()[rows]
+    trend['high_52w'] = cf.rolling(YEAR_BARS, min_periods=1).max().to_numpy()[rows]
+    trend['low_52w'] = cf.rolling(YEAR_BARS, min_periods=1).min().to_numpy()[rows]
+    tt = trend_template(pd.DataFrame({k: a.ravel() for k, a in trend.items()}))['tt_pass'].to_numpy()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fwd = c[rows + horizon] / price - 1
+    return {
+        'dates': close.index[rows], 'symbols': symbols, 'step': step, 'horizon': horizon,
+        'valid': valid, 'price': price, 'rs_score': rs_score, 'ad': ad, 'smr': smr, 'ind_rs': ind_rs,
+        'tt': tt.reshape(price.shape).astype(bool), 'fwd': np.where(valid, fwd, np.nan),
+    }
+
+
+def _allowed(grades):
+    """허용 등급 문자열 -> 등급 코드로 인덱싱하는 bool 조회표 (np.isin 보다 빠름)"""
+    table = np.zeros(len(GRADES), dtype=bool)
+    table[[GRADES.index(g) for g in grades]] = True
+    return table
+
+
+def screen_mask(f, min_price, rs_min, ind_rs_min, smr, ad, tt_only=False):
+    """dashboard_data.filter_results 와 같은 조건을 모든 리밸런싱 날짜에 적용한 (날짜 x 종목) 마스크"""
+    mask = f['valid'] & (f['price'] >= min_price) & (f['rs_score'] >= rs_min) & (f['ind_rs'] >= ind_rs_min)
+    mask &= _allowed(smr)[f['smr']] & _allowed(ad)[f['ad']]
+    if tt_only:
+        mask &= f['tt']
+    return mask
+
+
+def evaluate(f, params):
+    """
+    한 파라미터 조합의 성과. 각 리밸런싱 날짜에 통과 종목을 동일 비중으로 보유한다고 가정합니다.
+    - mean_ret / bench_ret: 기간당 평균 수익률 (bench: 그날 등급이 있는 전 종목 평균)
+    - hit_rate: 통과 종목 중 수익이 난 비율, beat_rate: 전 종목 평균을 이긴 비율
+    - turnover: 직전 리밸런싱 대비 새로 편입된 종목 비율 평균
+    - cagr / bench_cagr: 통과 종목이 없는 기간은 현금(수익률 0)
+    """
+    mask = screen_mask(f, **params)
+    fwd = f['fwd']
+    has_fwd = ~np.isnan(fwd)
+    picks = mask & has_fwd
+    n_picks = picks.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pick_ret = np.where(picks, fwd, 0).sum(axis=1) / n_picks
+        bench = np.where(has_fwd, fwd, 0).sum(axis=1) / has_fwd.sum(axis=1)
+        held = mask[1:].sum(axis=1)
+        turnover = 1 - (mask[1:] & mask[:-1]).sum(axis=1) / held
+    total = picks.sum()
+    periods_per_year = YEAR_BARS / f['step']
+    n_periods = len(n_picks)
+    growth = np.prod(1 + np.nan_to_num(pick_ret))
+    bench_growth = np.prod(1 + np.nan_to_num(bench))
+    return {
+        **params,
+        'avg_picks': float(n_picks.mean()),
+        'mean_ret': float(np.nanmean(pick_ret)) if (n_picks > 0).any() else np.nan,
+        'bench_ret': float(np.nanmean(bench)),
+        'excess': float(np.nanmean(pick_ret - bench)) if (n_picks > 0).any() else np.nan,
+        'hit_rate': float((picks & (fwd > 0)).sum() / total) if total else np.nan,
+        'beat_rate': float((picks & (fwd > bench[:, None])).sum() / total) if total else np.nan,
+        'turnover': float(np.nanmean(turnover[held > 0])) if (held > 0).any() else np.nan,
+        'cagr': float(growth ** (periods_per_year / n_periods) - 1),
+        'bench_cagr': float(bench_growth ** (periods_per_year / n_periods) - 1),
+    }
+
+
+def param_grid(grid=None):
+    grid = grid or DEFAULT_GRID
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+_worker_features = None
+
+
+def _init_worker(features):
+    # 특성 배열은 워커마다 한 번만 전달 (파라미터 조합마다 피클링하지 않음)
+    global _worker_features
+    _worker_features = features
+
+
+def _evaluate_in_worker(params):
+    return evaluate(_worker_features, params)
+
+
+def run_grid(features, params_list, workers=1):
+    """
+    파라미터 조합별 성과를 excess 내림차순 DataFrame 으로 반환합니다.
+    workers > 1 이면 조합을 프로세스 풀에 나눠 평가합니다.
+    """
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(features,)) as pool:
+            rows = list(pool.map(_evaluate_in_worker, params_list, chunksize=max(1, len(params_list) // (workers * 4))))
+    else:
+        rows = [evaluate(features, p) for p in params_list]
+    return pd.DataFrame(rows).sort_values('excess', ascending=False, ignore_index=True)
+
+
+def load_stored(years):
+    """가격 저장소의 일봉과 security_master 섹터 / 저장된 재무 데이터로 백테스트 입력을 만듭니다."""
+    db_conn = connect_readonly()
+    price_conn = get_price_conn()
+    try:
+        universe = load_universe(db_conn)
+        symbols = list(universe)
+        fundamentals = load_fundamentals(db_conn, symbols)
+        # 일간 배치(process_chunk)와 같은 규칙: 종목 정보(API)의 섹터가 있으면 우선, 없으면 security_master 섹터
+        sectors = {s: (fundamentals.get(s) or {}).get('sector') or sec for s, sec in universe.items()}
+        # 첫 리밸런싱 날짜에도 1년 이력이 있도록 1년을 더 읽음
+        panel = load_panel(price_conn, symbols, lookback_days=int(years * 365.25) + LOOKBACK_DAYS)
+    finally:
+        price_conn.close()
+        db_conn.close()
+    return panel['close'], panel['volume'], sectors, fundamentals
+
+
+def load_replay(n_symbols, years, seed=0):
+    """네트워크/저장소 없이 재현용 공급자의 합성 시계열로 백테스트 입력을 만듭니다 (성능 점검용)."""
+    symbols = [f"S{i:05d}" for i in range(n_symbols)]
+    provider = ReplayProvider(symbols, n_days=int((years + 1) * YEAR_BARS), latency=(0, 0), throttle_rate=0, seed=seed)
+    history = {s: provider.history(s) for s in symbols}
+    close = pd.DataFrame({s: h['Close'] for s, h in history.items()})
+    volume = pd.DataFrame({s: h['Volume'] for s, h in history.items()})
+    infos = {s: provider.get_info(s) for s in symbols}
+    sectors = {s: infos[s].get('sector') or 'Unknown' for s in symbols}
+    fundamentals = {s: {'roe': i.get('returnOnEquity'), 'margin': i.get('profitMargins'),
+                        'sales_growth': i.get('revenueGrowth')} for s, i in infos.items()}
+    return close, volume, sectors, fundamentals
+
+
+def backfill_prices(symbols, period, batch_size=30):
+    """
+    백테스트용으로 가격 저장소에 긴 이력(period, 예: '6y')을 받아 둡니다.
+    일간 배치는 최근 1년만 읽으므로 영향이 없습니다.
+    """
+    price_conn = get_price_conn()
+    engine = FetchEngine()
+    jobs = [(symbols[i:i + batch_size], {'period': period}) for i in range(0, len(symbols), batch_size)]
+    try:
+        for n, ((group, kwargs), data, err) in enumerate(
+                engine.map(lambda job: engine.call(download_prices, job[0], **job[1]), jobs), 1):
+            if err is not None:
+                print(f"Price Fetch Error ({len(group)}개): {err}")
+                continue
+            apply_download(price_conn, group, kwargs, data, {})
+            if n % 20 == 0:
+                print(f" > 이력 수집 {n} / {len(jobs)}")
+    finally:
+        price_conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="저장된 가격/재무 데이터로 대시보드 스크린 파라미터를 백테스트")
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--step', type=int, default=REBALANCE_DAYS, help="리밸런싱 간격(거래일)")
+    parser.add_argument('--horizon', type=int, default=None, help="보유 기간(거래일, 기본: --step)")
+    parser.add_argument('--workers', type=int, default=1, help="파라미터 조합을 나눠 평가할 프로세스 수")
+    parser.add_argument('--replay', type=int, default=None, help="저장소 대신 재현용 합성 데이터 N 종목 사용")
+    parser.add_argument('--backfill', default=None, help="먼저 가격 저장소에 이 기간(예: 6y)의 이력을 수집")
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--output', default=None, help="전체 결과 CSV 경로")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.backfill:
+        conn = connect_readonly()
+        try:
+            universe = list(load_universe(conn))
+        finally:
+            conn.close()
+        backfill_prices(universe, args.backfill)
+    if args.replay:
+        close, volume, sectors, fundamentals = load_replay(args.replay, args.years)
+    else:
+        close, volume, sectors, fundamentals = load_stored(args.years)
+    loaded = time.perf_counter()
+    features = compute_features(close, volume, sectors, fundamentals, args.step, args.horizon)
+    computed = time.perf_counter()
+    params_list = param_grid()
+    if DASHBOARD_SCREEN not in params_list:
+        params_list.append(DASHBOARD_SCREEN)
+    results = run_grid(features, params_list, args.workers)
+    done = time.perf_counter()
+
+    dates = features['dates']
+    print(f"--- {close.shape[1]}개 종목, {len(dates)}회 리밸런싱 ({dates[0]:%Y-%m-%d} ~ {dates[-1]:%Y-%m-%d}) ---")
+    print(f"--- 로드 {loaded - start:.1f}s, 등급 계산 {computed - loaded:.1f}s, "
+          f"파라미터 {len(params_list)}개 평가 {done - computed:.1f}s (workers={args.workers}) ---")
+    pd.set_option('display.width', 200)
+    print(results.head(args.top).round(4).to_string())
+    current = results[(results[list(DASHBOARD_SCREEN)] == pd.Series(DASHBOARD_SCREEN)).all(axis=1)]
+    print("\n대시보드 기본 스크린:")
+    print(current.round(4).to_string())
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"--- 결과 저장: {args.output} ---")
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import dashboard_data
+from fetch_engine import FetchEngine
+from fundamentals_cache import init_fundamentals, refresh_fundamentals
+from price_store import get_price_conn, sync_prices
+from providers import ReplayProvider, set_provider
+from security_master import get_sector_master_map
+from update_data import CHUNK_SIZE, process_chunk, rank_results, write_results
+
+# 재현용 공급자로 전체 파이프라인 단계별 처리 시간/메모리를 측정 (네트워크 없음)
+DEFAULT_SIZES = (1000, 6600, 20000)
+STAGES = ['fetch', 'rating', 'ranking', 'publish', 'dashboard']
+# 기준 결과보다 이 배수 이상 느려지면 회귀로 판단
+REGRESSION_TOLERANCE = 1.5
+
+
+class StageTimer:
+    """단계별 소요 시간과 (tracemalloc 기준) 최대 메모리를 기록합니다."""
+
+    def __init__(self, n_symbols, trace_memory=True):
+        self.n_symbols = n_symbols
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def run(self, stage, fn, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            if self.trace_memory:
+                tracemalloc.stop()
+            self.results[stage] = {
+                'seconds': round(seconds, 4),
+                'symbols_per_sec': round(self.n_symbols / seconds, 1) if seconds > 0 else None,
+                'peak_mb': round(peak / 2**20, 1) if peak is not None else None,
+            }
+
+
+def fetch(symbols, sectors, price_conn, db_conn, engine):
+    """가격 동기화 + 재무 갱신 (파이프라인과 같은 청크 단위)"""
+    for i in range(0, len(symbols), CHUNK_SIZE):
+        chunk = symbols[i:i + CHUNK_SIZE]
+        sync_prices(price_conn, chunk, engine=engine)
+        refresh_fundamentals(db_conn, chunk, {s: sectors.get(s, "Unknown") for s in chunk}, engine=engine)
+
+
+def rate(symbols, sectors, price_conn, db_conn, engine):
+    """이미 받은 데이터로 청크별 패널 로드 + RS/AD/트렌드 계산 + 결과 행 구성 (네트워크 호출 없음)"""
+    rows = []
+    for i in range(0, len(symbols), CHUNK_SIZE):
+        rows.extend(process_chunk(symbols[i:i + CHUNK_SIZE], sectors, price_conn, db_conn, engine))
+    df = pd.DataFrame(rows)
+    df['eps_growth'] = pd.to_numeric(df['eps_growth']).astype(float)
+    return df
+
+
+def load_dashboard(path):
+    """대시보드 첫 화면: 섹터 목록 + 기본 필터 결과 (캐시를 비운 상태에서)"""
+    dashboard_data._load_table.cache_clear()
+    sectors = dashboard_data.get_sectors(path)
+    return dashboard_data.get_leaders(10.0, 80, 50, ['A', 'B'], ['A', 'B', 'C'], sectors, path=path)
+
+
+def run_size(n_symbols, workdir, latency=0.0, trace_memory=True):
+    symbols = [f"S{i:05d}" for i in range(n_symbols)]
+    provider = ReplayProvider(symbols, latency=(latency, latency), throttle_rate=0)
+    previous = set_provider(provider)
+    price_conn = get_price_conn(os.path.join(workdir, 'price_store.db'))
+    db_path = os.path.join(workdir, 'ibd_system.db')
+    db_conn = sqlite3.connect(db_path)
+    init_fundamentals(db_conn)
+    engine = FetchEngine(rate=1e6, burst=1000)
+    timer = StageTimer(n_symbols, trace_memory)
+    try:
+        sectors = get_sector_master_map()
+        timer.run('fetch', fetch, symbols, sectors, price_conn, db_conn, engine)
+        calls = provider.calls
+        df = timer.run('rating', rate, symbols, sectors, price_conn, db_conn, engine)
+        final_df = timer.run('ranking', rank_results, df)
+        timer.run('publish', write_results, db_conn, final_df)
+        db_conn.commit()
+        leaders = timer.run('dashboard', load_dashboard, db_path)
+    finally:
+        price_conn.close()
+        db_conn.close()
+        set_provider(previous)
+    return {'n_symbols': n_symbols, 'n_ranked': len(final_df), 'n_leaders': len(leaders),
+            'provider_calls': calls, 'engine': dict(engine.stats), 'stages': timer.results}
+
+
+def find_regressions(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """같은 종목 수의 기준 결과와 비교해 tolerance 배 이상 느려진 단계 목록"""
+    base = {r['n_symbols']: r for r in baseline.get('runs', [])}
+    slow = []
+    for run in results['runs']:
+        ref = base.get(run['n_symbols'])
+        if not ref:
+            continue
+        for stage, m in run['stages'].items():
+            ref_sec = ref['stages'].get(stage, {}).get('seconds')
+            if ref_sec and m['seconds'] > ref_sec * tolerance:
+                slow.append((run['n_symbols'], stage, ref_sec, m['seconds']))
+    return slow
+
+
+def print_report(results):
+    print(f"\n{'종목 수':>8} {'단계':<10} {'시간(s)':>9} {'종목/s':>10} {'최대 메모리(MB)':>16}")
+    for run in results['runs']:
+        for stage in STAGES:
+            m = run['stages'][stage]
+            peak = f"{m['peak_mb']:.1f}" if m['peak_mb'] is not None else '-'
+            print(f"{run['n_symbols']:>8} {stage:<10} {m['seconds']:>9.3f} {m['symbols_per_sec'] or 0:>10.0f} {peak:>16}")
+        print(f"{'':>8} 랭킹 {run['n_ranked']}개, 주도주 {run['n_leaders']}개, 공급자 호출 {run['provider_calls']}회")
+    print(f"프로세스 최대 RSS: {results['max_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="재현용 공급자로 파이프라인 단계별 성능 측정")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="쉼표로 구분한 종목 수")
+    parser.add_argument('--latency', type=float, default=0.0, help="요청당 인위적 지연(초)")
+    parser.add_argument('--no-memory', action='store_true', help="tracemalloc 을 끄고 시간만 측정 (오버헤드 없음)")
+    parser.add_argument('--output', help="결과를 저장할 JSON 파일")
+    parser.add_argument('--baseline', help="비교할 이전 결과 JSON (회귀가 있으면 종료 코드 1)")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    results = {'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'runs': []}
+    for n in [int(s) for s in args.sizes.split(',') if s]:
+        workdir = tempfile.mkdtemp(prefix='bench-')
+        try:
+            print(f"--- {n}개 종목 측정 ---")
+            results['runs'].append(run_size(n, workdir, args.latency, not args.no_memory))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    # ru_maxrss 는 리눅스에서 KB 단위
+    results['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slow = find_regressions(results, json.load(f), args.tolerance)
+        for n, stage, before, after in slow:
+            print(f"회귀: {n}개 종목 {stage} {before:.3f}s -> {after:.3f}s")
+        sys.exit(1 if slow else 0)
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import sqlite3
+import zlib
+from datetime import datetime
+
+import pandas as pd
+
+# 청크 단위 중간 결과 저장소 (실행이 중간에 죽어도 완료된 청크는 보존)
+CHECKPOINT_DB = 'checkpoint.db'
+# 샤드 실행의 부분 결과 (샤드마다 별도 파일, 병합 단계가 모아서 게시)
+SHARD_CHECKPOINT_DB = 'checkpoint_shard{shard}of{n_shards}.db'
+
+RESULT_COLUMNS = ['symbol', 'price', 'rs_raw', 'ad_rating', 'roe', 'margin', 'sales_growth', 'sector',
+                  'eps_growth', 'ma50', 'ma150', 'ma200', 'ma200_1m', 'high_52w', 'low_52w']
+
+
+def make_run_key(tickers, chunk_size):
+    """같은 날, 같은 종목 목록, 같은 청크 크기일 때만 이어서 실행할 수 있도록 하는 키"""
+    digest = hashlib.sha1(f"{chunk_size}|{','.join(tickers)}".encode()).hexdigest()[:12]
+    return f"{datetime.now().strftime('%Y-%m-%d')}-{digest}"
+
+
+def open_checkpoint(run_key, resume=False, path=CHECKPOINT_DB):
+    """
+    체크포인트 DB 를 엽니다.
+    resume 이 아니거나 저장된 run_key 가 다르면(다른 날/다른 종목 목록) 기존 내용을 비웁니다.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS run_state (run_key TEXT, started_at TEXT)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chunk_status (
+            chunk_id INTEGER PRIMARY KEY,
+            n_symbols INTEGER,
+            n_results INTEGER,
+            done_at TEXT
+        )
+    """)
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(chunk_results)")]
+    if cols and cols[2:] != RESULT_COLUMNS[1:]:
+        # 결과 컬럼이 바뀐 예전 체크포인트는 이어서 쓸 수 없음
+        conn.execute("DROP TABLE chunk_results")
+        conn.execute("DELETE FROM chunk_status")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chunk_results (
+            symbol TEXT PRIMARY KEY,
+            chunk_id INTEGER,
+            price REAL, rs_raw REAL, ad_rating TEXT,
+            roe REAL, margin REAL, sales_growth REAL, sector TEXT,
+            eps_growth REAL, ma50 REAL, ma150 REAL, ma200 REAL, ma200_1m REAL, high_52w REAL, low_52w REAL
+        )
+    """)
+    row = conn.execute("SELECT run_key FROM run_state").fetchone()
+    if resume and row and row[0] == run_key:
+        print(f"--- 체크포인트 재개: {run_key} ({len(completed_chunks(conn))}개 청크 완료) ---")
+    else:
+        if resume:
+            print("--- 이어서 실행할 체크포인트가 없어 처음부터 시작합니다 ---")
+        with conn:
+            conn.execute("DELETE FROM run_state")
+            conn.execute("DELETE FROM chunk_status")
+            conn.execute("DELETE FROM chunk_results")
+            conn.execute("INSERT INTO run_state VALUES (?, ?)", (run_key, datetime.now().isoformat(timespec='seconds')))
+    return conn
+
+
+def completed_chunks(conn):
+    return {r[0] for r in conn.execute("SELECT chunk_id FROM chunk_status")}
+
+
+def save_chunk(conn, chunk_id, n_symbols, rows):
+    """청크 결과와 완료 표시를 하나의 트랜잭션으로 기록합니다."""
+    with conn:
+        conn.execute("DELETE FROM chunk_results WHERE chunk_id = ?", (chunk_id,))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO chunk_results VALUES ({','.join('?' * (len(RESULT_COLUMNS) + 1))})",
+            [(r['symbol'], chunk_id, *[r[c] for c in RESULT_COLUMNS[1:]]) for r in rows]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO chunk_status VALUES (?, ?, ?, ?)",
+            (chunk_id, n_symbols, len(rows), datetime.now().isoformat(timespec='seconds'))
+        )
+
+
+def load_results(conn):
+    return pd.read_sql(f"SELECT {', '.join(RESULT_COLUMNS)} FROM chunk_results ORDER BY symbol", conn)
+
+
+def shard_of(symbol, n_shards):
+    """심볼의 샤드 번호. 내장 hash() 와 달리 프로세스/러너가 달라도 항상 같은 값"""
+    return zlib.crc32(symbol.encode()) % n_shards
+
+
+def shard_tickers(tickers, shard, n_shards):
+    """tickers 중 shard 번 샤드에 속한 종목 (원래 순서 유지)"""
+    return [t for t in tickers if shard_of(t, n_shards) == shard]
+
+
+def shard_checkpoint_path(shard, n_shards):
+    return SHARD_CHECKPOINT_DB.format(shard=shard, n_shards=n_shards)
+
+
+def open_partial(path, run_key):
+    """
+    체크포인트(병합 단계의 샤드 부분 결과, publish 단독 실행의 checkpoint.db)를 읽기 전용으로 엽니다.
+    파일이 없거나 다른 실행(run_key)의 결과면 None (open_checkpoint 와 달리 내용을 지우지 않음)
+    """
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = conn.execute("SELECT run_key FROM run_state").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if not row or row[0] != run_key:
+        conn.close()
+        return None
+    return conn
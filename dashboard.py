@@ -1,9 +1,10 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-import yfinance as yf
 import streamlit.components.v1 as components
-import os
+from dashboard_data import get_sectors, get_leaders, get_stored_details, stored_detail_symbols, get_intraday_rs
+from detail_store import DetailPrefetcher, fetch_details
+
+PREFETCH_TOP_N = 30
 
 # --- 0. 페이지 설정 ---
 st.set_page_config(layout="wide", page_title="Institutional Stock Terminal")
@@ -30,13 +31,6 @@ FIN_MAP = {
     'Total Liabilities Net Minority Interest': '총 부채', 'Stockholders Equity': '총 자본'
 }
 
-def get_data():
-    if not os.path.exists('ibd_system.db'): return pd.DataFrame()
-    conn = sqlite3.connect('ibd_system.db')
-    df = pd.read_sql("SELECT * FROM repo_results", conn)
-    conn.close()
-    return df
-
 def format_date_idx(idx, type='Q'):
     if type == 'Q':
         return [f"{i.year} Q{(i.month-1)//3 + 1}" if hasattr(i, 'year') else str(i) for i in idx]
@@ -49,13 +43,22 @@ def calc_growth(series, periods):
     return growth.sort_index(ascending=False)
 
 @st.cache_data(ttl=3600)
+def fetch_detailed_info(ticker):
+    return fetch_details(ticker)
+
+@st.cache_resource
+def get_prefetcher():
+    # 세션 간에 공유되는 백그라운드 프리페처 (프로세스당 1개)
+    return DetailPrefetcher()
+
 def get_detailed_info(ticker):
-    s = yf.Ticker(ticker)
-    return s.quarterly_income_stmt, s.income_stmt, s.quarterly_balance_sheet, s.balance_sheet, s.info
+    # 1) 배치가 저장한 로컬 저장소 -> 2) 백그라운드 프리페치 결과 -> 3) 실시간 조회 (폴백)
+    return get_stored_details(ticker) or get_prefetcher().get(ticker) or fetch_detailed_info(ticker)
 
 # --- 2. 메인 화면 ---
-df = get_data()
-if not df.empty:
+# DB 파일이 바뀌지 않는 한 캐시된 테이블/쿼리 결과를 재사용 (슬라이더 이동마다 DB 를 다시 읽지 않음)
+all_sec = get_sectors()
+if all_sec:
     with st.sidebar:
         st.header("🎛️ Terminal Control")
         with st.expander("🔍 필터 설정", expanded=True):
@@ -64,20 +67,27 @@ if not df.empty:
             ind_rs_min = st.slider("최소 산업군 RS", 1, 99, 50) # [추가] 산업군 RS 필터
             smr_f = st.multiselect("SMR 등급", ["A", "B", "C", "D", "E"], default=["A", "B"])
             ad_f = st.multiselect("수급(AD) 등급", ["A", "B", "C", "D", "E"], default=["A", "B", "C"])
+            tt_only = st.checkbox("트렌드 템플릿 통과 종목만", value=False)
         with st.expander("🏢 산업군 필터"):
-            all_sec = sorted(df['sector'].unique())
             sel_sec = [s for s in all_sec if st.checkbox(s, value=(s != 'Unknown'))]
 
-    mask = (df['price'] >= min_price) & (df['rs_score'] >= rs_min) & \
-           (df['industry_rs_score'] >= ind_rs_min) & \
-           (df['smr_grade'].isin(smr_f)) & (df['ad_rating'].isin(ad_f)) & (df['sector'].isin(sel_sec))
-    f_df = df[mask].sort_values('rs_score', ascending=False)
+    f_df = get_leaders(min_price, rs_min, ind_rs_min, smr_f, ad_f, sel_sec, tt_only)
+    # 저장소에 없는 상위 주도주는 선택 전에 백그라운드에서 미리 받아 둠
+    stored = stored_detail_symbols()
+    get_prefetcher().prefetch([t for t in f_df['symbol'].head(PREFETCH_TOP_N) if t not in stored])
 
     col_l, col_r = st.columns([2.5, 4])
     with col_l:
         st.subheader(f"Leaders ({len(f_df)})")
         display_list = f_df.rename(columns={'symbol': 'Ticker', 'price': 'Price', 'rs_score': 'RS', 'smr_grade': 'SMR', 'ad_rating': 'AD', 'industry_rs_score': 'Ind RS', 'sector': 'Sector'})
-        sel = st.dataframe(display_list[['Ticker', 'Price', 'RS', 'SMR', 'AD', 'Ind RS', 'Sector']], 
+        list_cols = ['Ticker', 'Price', 'RS', 'SMR', 'AD', 'Ind RS', 'Sector']
+        # 장중 RS 스냅숏(intraday_rs.py)이 오늘 것이면 함께 표시
+        live = get_intraday_rs()
+        if not live.empty:
+            display_list['RS Live'] = display_list['Ticker'].map(live['rs_score']).astype('Int64')
+            list_cols.insert(3, 'RS Live')
+            st.caption(f"장중 RS 스냅숏: {live['snapshot_at'].iloc[0]}")
+        sel = st.dataframe(display_list[list_cols], 
                            use_container_width=True, hide_index=True, on_select="rerun", selection_mode="single-row", height=850)
 
     with col_r:
@@ -148,28 +158,36 @@ if not df.empty:
                 st.dataframe(format_fin_df(pd.concat([q_inc, q_bal]), 'Q'), use_container_width=True)
 
             with t_check:
-                cur_eps_growth = calc_growth(q_eps, 4).iloc[0] if len(q_eps) >= 5 else 0
+                # 배치가 미리 계산한 값 사용 (EPS 성장률이 없으면 재무제표로 계산)
+                cur_eps_growth = row['eps_growth'] if pd.notna(row['eps_growth']) else \
+                    (calc_growth(q_eps, 4).iloc[0] if len(q_eps) >= 5 else 0)
+                flag = lambda col: bool(row[col] == 1)
+                fmt = lambda v: f"{v:,.2f}" if pd.notna(v) else "N/A"
+                roe_pct = row['roe'] * 100 if pd.notna(row['roe']) else float('nan')
+                high_gap = (row['price'] / row['high_52w'] - 1) * 100 if pd.notna(row['high_52w']) else float('nan')
+                low_gap = (row['price'] / row['low_52w'] - 1) * 100 if pd.notna(row['low_52w']) else float('nan')
                 st.subheader("🛡️ 주도주 판별 시스템")
                 c1, c2 = st.columns(2)
                 with c1:
                     st.markdown("### 🟢 CANSLIM (오닐)")
-                    st.checkbox(f"**C**: 분기 EPS 25%↑ ({cur_eps_growth:.1f}%)", value=cur_eps_growth >= 25)
-                    st.checkbox("**A**: 연간 이익 증가 (ROE 17%↑)", value=True)
-                    st.checkbox("**N**: 신고가 또는 새로운 재료", value=True)
+                    st.checkbox(f"**C**: 분기 EPS 25%↑ ({cur_eps_growth:.1f}%)", value=bool(cur_eps_growth >= 25))
+                    st.checkbox(f"**A**: 연간 이익 증가 (ROE 17%↑, 현재: {fmt(roe_pct)}%)", value=bool(roe_pct >= 17))
+                    st.checkbox(f"**N**: 신고가 또는 새로운 재료 (52주 고가 대비 {fmt(high_gap)}%)", value=bool(high_gap >= -5))
                     st.checkbox(f"**S**: 공급과 수요 (AD: {row['ad_rating']})", value=row['ad_rating'] in ['A','B'])
                     st.checkbox(f"**L**: 시장 주도주 (RS: {row['rs_score']})", value=row['rs_score'] >= 80)
                     st.checkbox(f"**I**: 기관 매집 (SMR: {row['smr_grade']})", value=row['smr_grade'] in ['A','B'])
                     st.checkbox("**M**: 시장 대세 상승 확인", value=True)
                 with c2:
-                    st.markdown("### 🔵 트렌드 템플릿 (미너비니)")
-                    st.checkbox("1. 주가 > 150일 & 200일 MA", value=True)
-                    st.checkbox("2. 150일 MA > 200일 MA", value=True)
-                    st.checkbox("3. 200일 MA 우상향 유지", value=True)
-                    st.checkbox("4. 50일 MA > 150일 & 200일 MA", value=True)
-                    st.checkbox("5. 현재가 > 52주 저가 대비 30%↑", value=True)
-                    st.checkbox("6. 현재가 < 52주 고가 대비 25% 이내", value=True)
+                    tt_score = int(row['tt_score']) if pd.notna(row['tt_score']) else '-'
+                    st.markdown(f"### 🔵 트렌드 템플릿 (미너비니) {tt_score}/8")
+                    st.checkbox(f"1. 주가 > 150일 & 200일 MA ({fmt(row['ma150'])} / {fmt(row['ma200'])})", value=flag('tt_above_ma150_200'))
+                    st.checkbox("2. 150일 MA > 200일 MA", value=flag('tt_ma150_above_ma200'))
+                    st.checkbox(f"3. 200일 MA 우상향 유지 (1개월 전: {fmt(row['ma200_1m'])})", value=flag('tt_ma200_rising'))
+                    st.checkbox(f"4. 50일 MA > 150일 & 200일 MA (50일: {fmt(row['ma50'])})", value=flag('tt_ma50_above_ma150_200'))
+                    st.checkbox(f"5. 현재가 > 52주 저가 대비 30%↑ (+{fmt(low_gap)}%)", value=flag('tt_above_low_30'))
+                    st.checkbox(f"6. 현재가 < 52주 고가 대비 25% 이내 ({fmt(high_gap)}%)", value=flag('tt_near_high_25'))
                     st.checkbox(f"7. RS 점수 80 이상 (현재: {row['rs_score']})", value=row['rs_score'] >= 80)
-                    st.checkbox("8. 주가가 50일 MA 위에서 지지", value=True)
+                    st.checkbox("8. 주가가 50일 MA 위에서 지지", value=flag('tt_above_ma50'))
 
             with t_biz:
                 st.subheader(info.get('longName', ticker))
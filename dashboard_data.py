@@ -0,0 +1,143 @@
+import os
+import sqlite3
+from functools import lru_cache
+
+import pandas as pd
+
+from db_store import DB_PATH, INTRADAY_DB_PATH, connect_readonly
+from detail_store import load_details
+
+GRADES = ['A', 'B', 'C', 'D', 'E']
+RESULT_COLUMNS = ['symbol', 'price', 'rs_score', 'smr_grade', 'ad_rating', 'industry_rs_score', 'sector']
+# 배치가 미리 계산한 체크리스트 값 (예전 DB 에는 없을 수 있음)
+CHECK_COLUMNS = ['roe', 'eps_growth', 'ma50', 'ma150', 'ma200', 'ma200_1m', 'high_52w', 'low_52w',
+                 'tt_above_ma150_200', 'tt_ma150_above_ma200', 'tt_ma200_rising', 'tt_ma50_above_ma150_200',
+                 'tt_above_low_30', 'tt_near_high_25', 'tt_rs_80', 'tt_above_ma50', 'tt_score', 'tt_pass']
+
+
+def db_version(path=DB_PATH):
+    """
+    캐시 키: DB 파일(및 WAL 파일)의 수정 시각과 크기.
+    배치 작업이 새 결과를 게시하면 키가 바뀌어 자동으로 다시 읽습니다.
+    """
+    version = []
+    for p in (path, path + '-wal'):
+        if os.path.exists(p):
+            st = os.stat(p)
+            version.append((st.st_mtime_ns, st.st_size))
+    return tuple(version)
+
+
+def _connect(path):
+    # 대시보드는 읽기 전용으로만 접근
+    return connect_readonly(path)
+
+
+def _with_categories(df):
+    for c in RESULT_COLUMNS + CHECK_COLUMNS:
+        if c not in df.columns:
+            df[c] = pd.NA if c in RESULT_COLUMNS else float('nan')
+    df['smr_grade'] = pd.Categorical(df['smr_grade'], categories=GRADES)
+    df['ad_rating'] = pd.Categorical(df['ad_rating'], categories=GRADES)
+    df['sector'] = df['sector'].astype('category')
+    return df
+
+
+@lru_cache(maxsize=2)
+def _load_table(path, version):
+    conn = _connect(path)
+    try:
+        df = pd.read_sql("SELECT * FROM repo_results", conn)
+    finally:
+        conn.close()
+    return _with_categories(df)
+
+
+def load_results(path=DB_PATH):
+    """repo_results 전체를 (DB 버전이 같으면 캐시에서) 반환합니다."""
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return _load_table(path, db_version(path))
+
+
+def get_sectors(path=DB_PATH):
+    if not os.path.exists(path):
+        return []
+    return sorted(load_results(path)['sector'].dropna().unique())
+
+
+def filter_results(df, min_price, rs_min, ind_rs_min, smr, ad, sectors, tt_only=False):
+    mask = (df['price'] >= min_price) & (df['rs_score'] >= rs_min) & \
+           (df['industry_rs_score'] >= ind_rs_min) & \
+           (df['smr_grade'].isin(smr)) & (df['ad_rating'].isin(ad)) & (df['sector'].isin(sectors))
+    if tt_only:
+        mask &= df['tt_pass'] == 1
+    return df[mask].sort_values(['rs_score', 'symbol'], ascending=[False, True])
+
+
+def get_leaders(min_price, rs_min, ind_rs_min, smr, ad, sectors, tt_only=False, path=DB_PATH):
+    """
+    필터 조건에 맞는 종목을 RS 순으로 반환합니다. tt_only 면 트렌드 템플릿 통과 종목만.
+    repo_results 는 최신 날짜의 전 종목(수천 행)만 담으므로 캐시된 DataFrame 에서 pandas 로 필터링합니다.
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return filter_results(load_results(path), min_price, rs_min, ind_rs_min, smr, ad, sectors, tt_only)
+
+
+@lru_cache(maxsize=2)
+def _stored_detail_symbols(path, version):
+    conn = _connect(path)
+    try:
+        return frozenset(r[0] for r in conn.execute("SELECT symbol FROM company_profile WHERE status = 'ok'"))
+    except sqlite3.OperationalError:
+        return frozenset()
+    finally:
+        conn.close()
+
+
+@lru_cache(maxsize=256)
+def _load_stored_details(path, version, ticker):
+    conn = _connect(path)
+    try:
+        return load_details(conn, ticker)
+    finally:
+        conn.close()
+
+
+def stored_detail_symbols(path=DB_PATH):
+    """배치 작업이 상세 데이터(재무제표/개요)를 저장해 둔 종목 집합"""
+    if not os.path.exists(path):
+        return frozenset()
+    return _stored_detail_symbols(path, db_version(path))
+
+
+def get_stored_details(ticker, path=DB_PATH):
+    """로컬 저장소의 상세 데이터. 저장된 적이 없으면 None (네트워크 호출 없음)"""
+    if ticker not in stored_detail_symbols(path):
+        return None
+    return _load_stored_details(path, db_version(path), ticker)
+
+
+@lru_cache(maxsize=2)
+def _load_intraday(path, version):
+    conn = _connect(path)
+    try:
+        return pd.read_sql("SELECT symbol, rs_score, rs_change, snapshot_at FROM intraday_rs", conn).set_index('symbol')
+    except pd.errors.DatabaseError:
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+
+def get_intraday_rs(path=INTRADAY_DB_PATH):
+    """
+    intraday_rs.py 가 게시한 오늘의 장중 RS 스냅숏 (symbol 인덱스, rs_score / rs_change / snapshot_at).
+    장중 실행이 없었거나 지난 날짜의 스냅숏이면 빈 DataFrame
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    df = _load_intraday(path, db_version(path))
+    if df.empty or not str(df['snapshot_at'].iloc[0]).startswith(str(pd.Timestamp.today().date())):
+        return pd.DataFrame()
+    return df
@@ -0,0 +1,70 @@
+import sqlite3
+
+# git 에 커밋되는 결과 DB (대시보드가 읽기 전용으로 읽음)
+DB_PATH = 'ibd_system.db'
+# 장중 RS 스냅숏 DB. 몇 초마다 바뀌므로 결과 DB 와 분리해 대시보드의 결과/상세 캐시(DB 버전 키)를 무효화하지 않음
+INTRADAY_DB_PATH = 'intraday_rs.db'
+# 다른 연결이 쓰는 중이면 잠금이 풀릴 때까지 기다리는 시간
+BUSY_TIMEOUT = 30
+
+
+def connect_db(path=DB_PATH):
+    """
+    배치 작업용 연결. WAL 모드라 수집/게시 중에도 대시보드의 읽기가 막히지 않고,
+    읽는 쪽은 커밋이 끝나기 전까지 이전 스냅숏을 봅니다.
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def connect_readonly(path=DB_PATH):
+    """읽기만 하는 도구(대시보드/백테스트/장중 RS 시작)용 연결. 저널 모드를 바꾸지 않음"""
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT)
+
+
+def swap_table(conn, df, table):
+    """
+    df 를 스테이징 테이블에 먼저 쓰고, 기존 테이블 삭제 -> 이름 변경을 한 트랜잭션으로 교체합니다.
+    읽는 쪽은 교체 전 테이블 또는 교체 후 테이블 전체만 보고, 비었거나 쓰다 만 테이블은 보지 않습니다.
+    """
+    staging = f"{table}_staging"
+    df.to_sql(staging, conn, if_exists='replace', index=False)
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def db_pages(conn):
+    """(전체 페이지 수, 빈 페이지 수)"""
+    return conn.execute("PRAGMA page_count").fetchone()[0], conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def leave_wal(conn):
+    """
+    WAL 내용을 본 파일에 반영하고 롤백 저널(DELETE) 모드로 되돌립니다.
+    WAL 모드는 파일에 기록되어 유지되는데, WAL 파일은 읽기 전용 연결도 -shm 을 만들어야 열 수 있어
+    쓰기 권한이 없는 곳(읽기 전용 checkout)에서 대시보드가 열지 못하므로 WAL 은 배치 실행 중에만 사용합니다.
+    """
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return conn.execute("PRAGMA journal_mode=DELETE").fetchone()[0]
+
+
+def compact_db(conn):
+    """
+    VACUUM 으로 빈 페이지를 없애고 WAL 을 정리해 커밋할 수 있는 단일 파일(DELETE 모드)로 만듭니다.
+    git 에 커밋되는 파일을 작게 유지해 checkout / diff 를 빠르게 합니다.
+    반환값: (이전 페이지 수, 빈 페이지 수, 이후 페이지 수)
+    """
+    before, free = db_pages(conn)
+    conn.execute("VACUUM")
+    leave_wal(conn)
+    after, _ = db_pages(conn)
+    return before, free, after
@@ -0,0 +1,225 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from fetch_engine import error_category
+from fundamentals_cache import is_stale
+from providers import get_provider
+
+# 대시보드 상세 화면(재무제표/개요)에 쓰는 항목만 저장
+STATEMENT_ITEMS = {
+    'income': ['Total Revenue', 'Operating Income', 'Net Income', 'EBITDA', 'Basic EPS'],
+    'balance': ['Total Assets', 'Total Liabilities Net Minority Interest', 'Stockholders Equity'],
+}
+STATEMENTS = {
+    # (종류, 주기): yf.Ticker 속성
+    ('income', 'Q'): 'quarterly_income_stmt',
+    ('income', 'A'): 'income_stmt',
+    ('balance', 'Q'): 'quarterly_balance_sheet',
+    ('balance', 'A'): 'balance_sheet',
+}
+# 배치에서 상세 데이터를 저장할 상위 종목 수 (RS 순)
+DETAIL_TOP_N = int(os.environ.get('DETAIL_TOP_N', 800))
+DETAIL_MIN_PRICE = 10.0
+# 대시보드 프리페치에서 실패한 종목을 다시 요청하기까지 기다리는 시간(초).
+# Streamlit 은 필터를 바꿀 때마다 다시 실행되므로 실패 종목을 매번 재요청하면 요청 한도를 소모함
+PREFETCH_RETRY_SECONDS = int(os.environ.get('PREFETCH_RETRY_SECONDS', 600))
+
+
+def init_detail_store(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS financial_statements (
+            symbol TEXT NOT NULL,
+            statement TEXT NOT NULL,
+            freq TEXT NOT NULL,
+            item TEXT NOT NULL,
+            period_end TEXT NOT NULL,
+            value REAL,
+            PRIMARY KEY (symbol, statement, freq, item, period_end)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS company_profile (
+            symbol TEXT PRIMARY KEY,
+            long_name TEXT,
+            summary TEXT,
+            status TEXT,
+            fetched_at TEXT
+        )
+    """)
+    conn.commit()
+
+
+def fetch_details(ticker, call=None):
+    """
+    공급자(yfinance)에서 분기/연간 손익계산서, 재무상태표, 회사 개요를 가져옵니다.
+    반환값: (q_inc, a_inc, q_bal, a_bal, info) - dashboard.get_detailed_info 와 같은 형태
+    """
+    call = call or (lambda fn, *args: fn(*args))
+    t = get_provider().ticker(ticker)
+    frames = {key: call(getattr, t, attr) for key, attr in STATEMENTS.items()}
+    info = call(getattr, t, 'info') or {}
+    return (frames[('income', 'Q')], frames[('income', 'A')],
+            frames[('balance', 'Q')], frames[('balance', 'A')], info)
+
+
+def save_details(conn, ticker, details):
+    q_inc, a_inc, q_bal, a_bal, info = details
+    frames = {('income', 'Q'): q_inc, ('income', 'A'): a_inc, ('balance', 'Q'): q_bal, ('balance', 'A'): a_bal}
+    rows = []
+    for (stmt, freq), df in frames.items():
+        if df is None or df.empty:
+            continue
+        sub = df.reindex(STATEMENT_ITEMS[stmt]).dropna(how='all')
+        for item, series in sub.iterrows():
+            for period, value in series.dropna().items():
+                rows.append((ticker, stmt, freq, item, pd.Timestamp(period).strftime('%Y-%m-%d'), float(value)))
+    conn.execute("DELETE FROM financial_statements WHERE symbol = ?", (ticker,))
+    conn.executemany("INSERT OR REPLACE INTO financial_statements VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.execute(
+        "INSERT OR REPLACE INTO company_profile VALUES (?, ?, ?, ?, ?)",
+        (ticker, info.get('longName'), info.get('longBusinessSummary'), 'ok',
+         datetime.now().isoformat(timespec='seconds'))
+    )
+
+
+def load_details(conn, ticker):
+    """
+    저장소에서 상세 데이터를 읽어 yfinance 와 같은 형태(항목 x 기간, 최신 기간이 왼쪽)로 반환합니다.
+    저장된 적이 없으면 None.
+    """
+    profile = conn.execute(
+        "SELECT long_name, summary FROM company_profile WHERE symbol = ? AND status = 'ok'", (ticker,)
+    ).fetchone()
+    if not profile:
+        return None
+    df = pd.read_sql(
+        "SELECT statement, freq, item, period_end, value FROM financial_statements WHERE symbol = ?",
+        conn, params=[ticker]
+    )
+    df['period_end'] = pd.to_datetime(df['period_end'])
+    frames = []
+    for key in [('income', 'Q'), ('income', 'A'), ('balance', 'Q'), ('balance', 'A')]:
+        sub = df[(df['statement'] == key[0]) & (df['freq'] == key[1])]
+        wide = sub.pivot(index='item', columns='period_end', values='value') if not sub.empty else pd.DataFrame()
+        frames.append(wide.sort_index(axis=1, ascending=False))
+    info = {'longBusinessSummary': profile[1] or 'N/A'}
+    if profile[0]:
+        info['longName'] = profile[0]
+    return (*frames, info)
+
+
+def quarterly_eps_growth(conn):
+    """
+    저장된 분기 손익계산서의 Basic EPS 로 전년 동기 대비 성장률(%)을 계산합니다.
+    (대시보드 calc_growth(q_eps, 4) 와 같은 정의: 최신 분기 vs 4분기 전)
+    반환값: symbol 인덱스 Series
+    """
+    try:
+        df = pd.read_sql(
+            "SELECT symbol, period_end, value FROM financial_statements "
+            "WHERE statement = 'income' AND freq = 'Q' AND item = 'Basic EPS'", conn
+        )
+    except Exception:
+        return pd.Series(dtype=float)
+    df = df.sort_values(['symbol', 'period_end'], ascending=[True, False])
+    df['n'] = df.groupby('symbol').cumcount()
+    wide = df[df['n'].isin([0, 4])].pivot(index='symbol', columns='n', values='value')
+    if 0 not in wide.columns or 4 not in wide.columns:
+        return pd.Series(dtype=float)
+    return ((wide[0] - wide[4]) / wide[4].abs() * 100).replace([float('inf'), float('-inf')], float('nan')).dropna()
+
+
+def select_detail_symbols(conn, top_n=DETAIL_TOP_N, min_price=DETAIL_MIN_PRICE):
+    """상세 데이터를 미리 저장해 둘 주도주 후보: 최소 주가 이상 종목 중 RS 상위 top_n"""
+    return [r[0] for r in conn.execute(
+        "SELECT symbol FROM repo_results WHERE price >= ? ORDER BY rs_score DESC LIMIT ?", (min_price, top_n)
+    )]
+
+
+def refresh_details(conn, symbols, engine=None, metrics=None):
+    """
+    저장된 지 FUNDAMENTALS_TTL_DAYS 가 지난(또는 없는) 종목만 다시 받아 저장합니다.
+    반환값: (갱신 성공 수, 실패 수)
+    """
+    init_detail_store(conn)
+    fetched = {}
+    for i in range(0, len(symbols), 500):
+        part = symbols[i:i + 500]
+        q = f"SELECT symbol, status, fetched_at FROM company_profile WHERE symbol IN ({','.join('?' * len(part))})"
+        fetched.update({r[0]: {'status': r[1], 'fetched_at': r[2]} for r in conn.execute(q, part)})
+    stale = [s for s in symbols if is_stale(fetched.get(s))]
+
+    if engine is None:
+        results = ((s, fetch_details(s), None) for s in stale)
+    else:
+        results = engine.map(lambda s: fetch_details(s, engine.call), stale)
+
+    ok, failed = 0, 0
+    for sym, details, err in results:
+        if err is not None:
+            failed += 1
+            if metrics:
+                metrics.failure(f"details:{error_category(err)}")
+            continue
+        save_details(conn, sym, details)
+        ok += 1
+        if ok % 100 == 0:
+            conn.commit()
+            print(f" > 상세 데이터 {ok} / {len(stale)} 저장")
+    conn.commit()
+    return ok, failed
+
+
+class DetailPrefetcher:
+    """
+    대시보드용 백그라운드 프리페처.
+    저장소에 없는 주도주의 상세 데이터를 워커 스레드에서 미리 받아 메모리에 보관합니다.
+    실패한 종목은 실패 시각을 기록해 retry_seconds 동안 다시 요청하지 않습니다.
+    """
+
+    def __init__(self, fetch=fetch_details, max_workers=4, max_items=200, retry_seconds=PREFETCH_RETRY_SECONDS):
+        self.fetch = fetch
+        self.max_items = max_items
+        self.retry_seconds = retry_seconds
+        self.cache = {}
+        self.pending = set()
+        self.failed = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _run(self, symbol):
+        try:
+            details = self.fetch(symbol)
+        except Exception:
+            details = None
+        with self.lock:
+            self.pending.discard(symbol)
+            if details is None:
+                self.failed[symbol] = time.monotonic()
+                return
+            self.failed.pop(symbol, None)
+            if len(self.cache) >= self.max_items:
+                self.cache.pop(next(iter(self.cache)))
+            self.cache[symbol] = details
+
+    def _cooling_down(self, symbol, now):
+        failed_at = self.failed.get(symbol)
+        return failed_at is not None and now - failed_at < self.retry_seconds
+
+    def prefetch(self, symbols):
+        now = time.monotonic()
+        with self.lock:
+            todo = [s for s in symbols
+                    if s not in self.cache and s not in self.pending and not self._cooling_down(s, now)]
+            self.pending.update(todo)
+        for s in todo:
+            self.pool.submit(self._run, s)
+
+    def get(self, symbol):
+        with self.lock:
+            return self.cache.get(symbol)
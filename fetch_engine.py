@@ -0,0 +1,157 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 동시 요청 수와 초당 요청 한도 (GitHub Actions 에서는 env 로 조정)
+FETCH_WORKERS = int(os.environ.get('FETCH_WORKERS', 8))
+FETCH_RATE = float(os.environ.get('FETCH_RATE', 4.0))      # 초당 토큰 보충량
+FETCH_BURST = int(os.environ.get('FETCH_BURST', 8))        # 버킷 최대 토큰 수
+FETCH_RETRIES = int(os.environ.get('FETCH_RETRIES', 4))
+FETCH_TIMEOUT = float(os.environ.get('FETCH_TIMEOUT', 30))  # 요청당 타임아웃(초)
+
+THROTTLE_MARKERS = ('429', 'too many requests', 'rate limit')
+
+
+class TokenBucket:
+    """
+    모든 워커가 공유하는 토큰 버킷 레이트 리미터.
+    acquire() 는 토큰이 생길 때까지 필요한 만큼만 대기합니다.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_throttle_error(exc):
+    if type(exc).__name__ == 'YFRateLimitError':
+        return True
+    msg = str(exc).lower()
+    return any(m in msg for m in THROTTLE_MARKERS)
+
+
+def error_category(exc):
+    """실행 지표용 실패 분류: throttled / timeout / 예외 클래스 이름"""
+    if isinstance(exc, TimeoutError):
+        return 'timeout'
+    if is_throttle_error(exc):
+        return 'throttled'
+    return type(exc).__name__
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """지수 백오프 + full jitter: [0, min(cap, base * 2^attempt)] 구간에서 무작위 대기"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _run_with_timeout(fn, timeout, *args, **kwargs):
+    """
+    fn 을 별도 데몬 스레드에서 실행하고 timeout 초 안에 끝나지 않으면 TimeoutError.
+    (yfinance 호출은 중단할 수 없으므로 결과만 버리고 워커는 다음 작업으로 넘어감)
+    """
+    if not timeout:
+        return fn(*args, **kwargs)
+    box = {}
+
+    def target():
+        try:
+            box['result'] = fn(*args, **kwargs)
+        except BaseException as e:
+            box['error'] = e
+
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    t.join(timeout)
+    if t.is_alive():
+        raise TimeoutError(f"request timed out after {timeout}s")
+    if 'error' in box:
+        raise box['error']
+    return box.get('result')
+
+
+class FetchEngine:
+    """
+    가격/재무 요청을 워커 풀에서 동시에 실행하는 엔진.
+    - 공유 토큰 버킷으로 전체 요청 속도를 제한
+    - 스로틀링(429)/타임아웃은 지수 백오프 + jitter 로 재시도
+    - 그 외 예외는 즉시 호출자에게 전달
+    """
+
+    def __init__(self, max_workers=FETCH_WORKERS, rate=FETCH_RATE, burst=FETCH_BURST,
+                 retries=FETCH_RETRIES, timeout=FETCH_TIMEOUT, base_delay=1.0, max_delay=60.0):
+        self.max_workers = max_workers
+        self.limiter = TokenBucket(rate, burst)
+        self.retries = retries
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'timeouts': 0, 'failures': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def call(self, fn, *args, **kwargs):
+        """레이트 리밋, 타임아웃, 백오프 재시도를 적용해 fn 을 한 번 호출합니다."""
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            self._count('calls')
+            try:
+                return _run_with_timeout(fn, self.timeout, *args, **kwargs)
+            except Exception as e:
+                if isinstance(e, TimeoutError):
+                    self._count('timeouts')
+                elif is_throttle_error(e):
+                    self._count('throttled')
+                else:
+                    self._count('failures')
+                    raise
+                if attempt >= self.retries:
+                    self._count('failures')
+                    raise
+                self._count('retries')
+                time.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+
+    def map(self, fn, items):
+        """
+        items 의 각 원소에 fn 을 동시에 적용하고 완료 순서대로 (item, result, error) 를 돌려줍니다.
+        fn 은 내부에서 self.call() 로 네트워크 요청을 보내야 레이트 리밋이 적용됩니다.
+        결과 처리(DB 저장 등)는 호출한 스레드에서 이뤄지므로 sqlite 연결을 공유하지 않아도 됩니다.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(fn, item): idx for idx, item in enumerate(items)}
+            for fut in as_completed(futures):
+                item = items[futures[fut]]
+                try:
+                    yield item, fut.result(), None
+                except Exception as e:
+                    yield item, None, e
+
+
+if __name__ == "__main__":
+    # 오프라인 점검: 지연과 429 실패를 주입하는 가짜 공급자로 엔진을 돌려봅니다.
+    from providers import ReplayProvider
+
+    provider = ReplayProvider(symbols=[f"S{i:04d}" for i in range(200)], throttle_rate=0.1)
+    engine = FetchEngine(max_workers=16, rate=200, burst=20, base_delay=0.05, max_delay=0.5, timeout=2)
+    start = time.time()
+    done = sum(1 for _, res, err in engine.map(lambda s: engine.call(provider.get_info, s), provider.symbols) if err is None)
+    print(f"{done} / {len(provider.symbols)} 완료 ({time.time() - start:.2f}s) | {engine.stats}")
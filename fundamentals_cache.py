@@ -0,0 +1,188 @@
+import os
+from datetime import datetime, timedelta
+
+from fetch_engine import error_category
+from providers import get_provider
+
+# 재무 데이터는 분기 단위로만 바뀌므로 TTL 동안은 yf.Ticker().info 를 다시 호출하지 않음
+FUNDAMENTALS_TTL_DAYS = int(os.environ.get('FUNDAMENTALS_TTL_DAYS', 30))
+# 섹터를 끝내 못 찾은 종목(음성 결과)은 더 길게 캐시해 매일 재시도하지 않음
+NEGATIVE_TTL_DAYS = int(os.environ.get('FUNDAMENTALS_NEGATIVE_TTL_DAYS', 90))
+# 네트워크 오류 등 일시적 실패는 다음 실행에서 다시 시도
+ERROR_TTL_DAYS = 1
+
+STATUS_TTL = {'ok': FUNDAMENTALS_TTL_DAYS, 'no_sector': NEGATIVE_TTL_DAYS, 'error': ERROR_TTL_DAYS}
+
+
+def init_fundamentals(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fundamentals (
+            symbol TEXT PRIMARY KEY,
+            sector TEXT,
+            roe REAL,
+            margin REAL,
+            sales_growth REAL,
+            status TEXT,
+            fetched_at TEXT,
+            eps_growth REAL
+        )
+    """)
+    # 예전 스키마에는 분기 EPS 성장률 컬럼이 없음
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(fundamentals)")]
+    if 'eps_growth' not in cols:
+        conn.execute("ALTER TABLE fundamentals ADD COLUMN eps_growth REAL")
+    conn.commit()
+
+
+def load_fundamentals(conn, symbols):
+    rows = []
+    for i in range(0, len(symbols), 500):
+        part = symbols[i:i + 500]
+        q = (f"SELECT symbol, sector, roe, margin, sales_growth, status, fetched_at, eps_growth FROM fundamentals "
+             f"WHERE symbol IN ({','.join('?' * len(part))})")
+        rows.extend(conn.execute(q, part).fetchall())
+    keys = ['symbol', 'sector', 'roe', 'margin', 'sales_growth', 'status', 'fetched_at', 'eps_growth']
+    return {r[0]: dict(zip(keys, r)) for r in rows}
+
+
+def is_stale(record, now=None):
+    if not record or not record.get('fetched_at'):
+        return True
+    now = now or datetime.now()
+    ttl = STATUS_TTL.get(record.get('status'), ERROR_TTL_DAYS)
+    return datetime.fromisoformat(record['fetched_at']) + timedelta(days=ttl) <= now
+
+
+def _get_info(ticker):
+    return get_provider().get_info(ticker)
+
+
+def _direct_call(fn, *args):
+    return fn(*args)
+
+
+def fetch_info_with_retry(call, ticker, retries=2):
+    """
+    섹터가 비어 있는 info 를 받으면 재시도합니다.
+    대기는 call(FetchEngine.call)의 레이트 리미터와 백오프가 담당하므로 고정 sleep 은 두지 않습니다.
+    반환값: (info 또는 None, 시도 횟수)
+    """
+    for attempt in range(retries + 1):
+        try:
+            info = call(_get_info, ticker)
+            if info and 'sector' in info:
+                return info, attempt + 1
+        except Exception:
+            if attempt >= retries:
+                raise
+    return None, retries + 1
+
+
+def fetch_fundamentals(ticker, known_sector="Unknown", call=None):
+    """
+    공급자의 info(yf.Ticker().info) 에서 ROE / 이익률 / 매출 성장률과 섹터를 가져옵니다.
+    섹터를 모르는 종목만 재시도 로직을 사용합니다.
+    DB 를 건드리지 않으므로 워커 스레드에서 호출해도 안전합니다.
+    """
+    call = call or _direct_call
+    record = {'symbol': ticker, 'sector': None, 'roe': 0, 'margin': 0, 'sales_growth': 0,
+              'status': 'ok', 'fetched_at': datetime.now().isoformat(timespec='seconds'), 'eps_growth': None,
+              'attempts': 1, 'error': None}
+    try:
+        if known_sector == "Unknown":
+            info, record['attempts'] = fetch_info_with_retry(call, ticker, retries=2)
+            if not info:
+                record['status'] = 'no_sector'
+                return record
+        else:
+            # 섹터를 이미 알면 한 번만 시도 (재무 데이터용)
+            info = call(_get_info, ticker)
+
+        if info:
+            record['roe'] = info.get('returnOnEquity', 0) or 0
+            record['margin'] = info.get('profitMargins', 0) or 0
+            record['sales_growth'] = info.get('revenueGrowth', 0) or 0
+            record['sector'] = info.get('sector')
+            # 전년 동기 대비 분기 이익 성장률 (CANSLIM 'C' 의 대체값, 재무제표가 없을 때 사용)
+            record['eps_growth'] = info.get('earningsQuarterlyGrowth')
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = error_category(e)
+    return record
+
+
+def save_fundamentals(conn, record):
+    conn.execute(
+        "INSERT OR REPLACE INTO fundamentals "
+        "(symbol, sector, roe, margin, sales_growth, status, fetched_at, eps_growth) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (record['symbol'], record['sector'], record['roe'], record['margin'],
+         record['sales_growth'], record['status'], record['fetched_at'], record.get('eps_growth'))
+    )
+
+
+def import_fundamentals(conn, records):
+    """
+    다른 DB(샤드 부분 결과)에서 가져온 {symbol: record} 중 이 DB 보다 최근에 조회한 레코드만 반영합니다.
+    반환값: 반영한 레코드 수
+    """
+    current = load_fundamentals(conn, list(records))
+    newer = [r for s, r in records.items()
+             if r.get('fetched_at') and r['fetched_at'] > ((current.get(s) or {}).get('fetched_at') or '')]
+    for record in newer:
+        save_fundamentals(conn, record)
+    conn.commit()
+    return len(newer)
+
+
+def _merge(fresh, old):
+    if fresh['status'] == 'error' and old:
+        # 일시적 실패면 이전 값을 유지하되 다음 실행에서 다시 시도
+        return dict(old, status='error', fetched_at=fresh['fetched_at'])
+    return fresh
+
+
+def refresh_fundamentals(conn, symbols, sectors, engine=None, metrics=None, plan=None):
+    """
+    캐시가 만료되었거나 없는 종목만 API 를 호출해 갱신하고 {symbol: record} 를 반환합니다.
+    engine(FetchEngine)이 주어지면 호출을 워커 풀에서 동시에 실행하고 저장은 이 스레드에서 합니다.
+    metrics(RunMetrics)가 주어지면 캐시 적중, 결과 상태, 섹터 재시도, 실패 분류를 기록합니다.
+    plan(refresh_scheduler.RefreshPlan)이 주어지면 등급별 TTL 과 호출 예산으로 고른 종목만 갱신합니다.
+    반환값: (records, API 를 호출한 종목 수)
+    """
+    cache = load_fundamentals(conn, symbols)
+    if plan is None:
+        stale = [s for s in symbols if is_stale(cache.get(s))]
+    else:
+        stale = plan.select(symbols, cache, metrics)
+
+    if engine is None:
+        results = ((s, fetch_fundamentals(s, sectors.get(s, "Unknown")), None) for s in stale)
+    else:
+        results = engine.map(lambda s: fetch_fundamentals(s, sectors.get(s, "Unknown"), engine.call), stale)
+
+    if metrics:
+        # 예산으로 미뤄진 종목(plan 의 fundamentals_deferred)은 캐시 적중으로 세지 않음
+        due = (lambda s: is_stale(cache.get(s))) if plan is None else (lambda s: plan.due(s, cache.get(s)))
+        called = set(stale)
+        metrics.count('fundamentals_cached', sum(1 for s in symbols if s not in called and not due(s)))
+    updated = []
+    for n, (sym, fresh, err) in enumerate(results, 1):
+        if err is not None:
+            if metrics:
+                metrics.failure(f"fundamentals:{error_category(err)}")
+            continue
+        if metrics:
+            metrics.count(f"fundamentals_{fresh['status']}")
+            metrics.count('info_retries', fresh['attempts'] - 1)
+            if fresh['error']:
+                metrics.failure(f"fundamentals:{fresh['error']}")
+        cache[sym] = _merge(fresh, cache.get(sym))
+        updated.append(cache[sym])
+        if n % 100 == 0:
+            print(f" > 재무 데이터 {n} / {len(stale)} 갱신")
+    # 네트워크 대기 중에는 쓰기 트랜잭션을 열지 않고, 청크의 결과를 짧은 트랜잭션 한 번으로 저장
+    # (로컬 샤드 프로세스들이 같은 ibd_system.db 에 쓰므로 잠금을 오래 잡으면 다른 프로세스가 BUSY_TIMEOUT 으로 실패)
+    with conn:
+        for record in updated:
+            save_fundamentals(conn, record)
+    return cache, len(stale)
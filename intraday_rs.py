@@ -0,0 +1,225 @@
+import argparse
+import bisect
+import os
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_store import INTRADAY_DB_PATH, connect_db, connect_readonly, swap_table
+from price_store import get_price_conn, load_panel
+from providers import get_provider
+from rating_engine import MIN_HISTORY, RS_ANCHORS, bottom_align, rs_raw_from_panel, tail_row
+from security_master import load_universe
+
+# 장중 RS 스냅숏을 대시보드용 테이블로 게시하는 주기(초)
+SNAPSHOT_SECONDS = float(os.environ.get('INTRADAY_SNAPSHOT_SECONDS', 15))
+# poll 피드: 공급자에서 현재가를 다시 받는 주기(초)와 요청당 종목 수
+POLL_SECONDS = float(os.environ.get('INTRADAY_POLL_SECONDS', 60))
+POLL_BATCH = 200
+SNAPSHOT_TABLE = 'intraday_rs'
+
+
+def rs_score_from_rank(lo, hi, n):
+    """
+    정렬 배열에서 값의 위치(bisect_left = lo, bisect_right = hi)로 구한 RS 점수 (정수 변환 전).
+    동순위는 평균 순위를 쓰므로 일간 배치의 (rank(pct=True) * 98 + 1).astype(int) 와 같습니다.
+    """
+    return (lo + hi + 1) / 2 / n * 98 + 1
+
+
+def load_anchors(price_conn, symbols, today=None):
+    """
+    가격 저장소의 일봉으로 종목별 RS 앵커를 계산합니다.
+    반환값: DataFrame(index=symbol) - close: 마지막 종가, rs_raw: 일간 배치와 같은 값,
+    w_tick: 장중 가격 p 를 오늘 봉으로 볼 때 rs_raw = p * w_tick 이 되는 계수
+    (저장소에 이미 오늘 봉이 있으면 그 봉을 대체, 없으면 새 봉으로 보고 63/126/189 봉 앵커를 하루씩 당김.
+     1년 구간 첫 종가는 그대로 사용)
+    """
+    panel = load_panel(price_conn, symbols)
+    close = panel['close']
+    if close.empty:
+        return pd.DataFrame(columns=['close', 'rs_raw', 'w_tick'])
+    volume = panel['volume'].reindex(index=close.index, columns=close.columns)
+    c, _, counts = bottom_align(close.to_numpy(dtype=float), volume.to_numpy(dtype=float))
+    rs = rs_raw_from_panel(c, counts)
+    # compute_ratings 와 같은 유효 조건
+    valid = (counts >= MIN_HISTORY) & ~np.isnan(rs)
+
+    today = today or datetime.now().date()
+    shift = 0 if close.index[-1].date() == today else 1
+    n_rows = c.shape[0]
+    first = c[np.clip(n_rows - counts, 0, n_rows - 1), np.arange(c.shape[1])]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w_tick = 2 / tail_row(c, RS_ANCHORS[0] - shift) + 1 / first
+        for k in RS_ANCHORS[1:]:
+            w_tick = w_tick + 1 / tail_row(c, k - shift)
+    df = pd.DataFrame({'close': c[-1], 'rs_raw': rs, 'w_tick': w_tick}, index=close.columns)
+    return df[valid & np.isfinite(w_tick)]
+
+
+class IntradayRanker:
+    """
+    장중 가격 틱으로 RS 점수를 증분 갱신합니다.
+    - 앵커 종가는 장중에 바뀌지 않으므로 종목의 rs_raw 는 가격 x w_tick (틱 하나에 곱셈 한 번)
+    - 전 종목 rs_raw 를 정렬 배열로 유지하고 bisect 로 위치를 찾아, 틱마다 rank(pct=True) 를
+      전체 종목에 다시 돌리지 않고 O(log n) 탐색으로 그 종목의 백분위를 구합니다
+      (삽입/삭제는 list 의 memmove 라 수만 종목에서도 마이크로초 단위)
+    아직 틱을 받지 않은 종목은 일간 배치와 같은 rs_raw 를 사용합니다.
+    """
+
+    def __init__(self, anchors, daily_scores=None):
+        self.price = anchors['close'].to_dict()
+        self.raw = anchors['rs_raw'].to_dict()
+        self.weight = anchors['w_tick'].to_dict()
+        self.sorted_raw = sorted(self.raw.values())
+        self.daily = daily_scores or {}
+        self.updated = {}
+        self.ticks = 0
+
+    def __len__(self):
+        return len(self.sorted_raw)
+
+    def update(self, symbol, price):
+        """틱 하나를 반영하고 그 종목의 새 RS 점수를 반환합니다 (유니버스 밖 종목이나 잘못된 가격은 None)."""
+        old = self.raw.get(symbol)
+        if old is None or not price > 0:
+            return None
+        new = price * self.weight[symbol]
+        a = self.sorted_raw
+        del a[bisect.bisect_left(a, old)]
+        bisect.insort(a, new)
+        self.raw[symbol] = new
+        self.price[symbol] = price
+        self.updated[symbol] = time.time()
+        self.ticks += 1
+        return self.score(symbol)
+
+    def score(self, symbol):
+        x = self.raw[symbol]
+        a = self.sorted_raw
+        return int(rs_score_from_rank(bisect.bisect_left(a, x), bisect.bisect_right(a, x), len(a)))
+
+    def snapshot(self):
+        """전 종목의 현재 RS 점수 (정렬 배열에 대한 searchsorted 한 번)"""
+        symbols = list(self.raw)
+        raw = np.fromiter((self.raw[s] for s in symbols), dtype=float, count=len(symbols))
+        a = np.asarray(self.sorted_raw)
+        scores = rs_score_from_rank(np.searchsorted(a, raw, 'left'), np.searchsorted(a, raw, 'right'), len(a)).astype(int)
+        daily = pd.array([self.daily.get(s) for s in symbols], dtype='Int64')
+        updated = [self.updated.get(s) for s in symbols]
+        return pd.DataFrame({
+            'symbol': symbols,
+            'price': [self.price[s] for s in symbols],
+            'rs_raw': raw,
+            'rs_score': scores,
+            'rs_daily': daily,
+            'rs_change': scores - daily,
+            'updated_at': [datetime.fromtimestamp(t).isoformat(timespec='seconds') if t else None for t in updated],
+        })
+
+
+def build_ranker(price_conn, db_conn, symbols):
+    """가격 저장소의 앵커와 마지막으로 게시된 일간 RS 점수로 IntradayRanker 를 만듭니다."""
+    anchors = load_anchors(price_conn, symbols)
+    daily = dict(db_conn.execute("SELECT symbol, rs_score FROM repo_results"))
+    return IntradayRanker(anchors, daily)
+
+
+def publish_snapshot(conn, df):
+    """repo_results 와 같은 방식(스테이징 후 교체)으로 게시해 대시보드가 쓰다 만 스냅숏을 보지 않도록 함"""
+    df = df.assign(snapshot_at=datetime.now().isoformat(timespec='seconds'))
+    swap_table(conn, df, SNAPSHOT_TABLE)
+
+
+def replay_feed(prices, n_ticks=None, volatility=0.002, seed=0):
+    """
+    네트워크 없는 재현용 피드: 마지막 종가에서 시작하는 무작위 보행 틱 (symbol, price).
+    n_ticks 가 None 이면 끝없이 생성합니다.
+    """
+    rng = random.Random(seed)
+    last = dict(prices)
+    symbols = list(last)
+    n = 0
+    while n_ticks is None or n < n_ticks:
+        s = symbols[rng.randrange(len(symbols))]
+        last[s] *= 1 + rng.gauss(0, volatility)
+        yield s, last[s]
+        n += 1
+
+
+def poll_feed(symbols, interval=POLL_SECONDS, batch_size=POLL_BATCH):
+    """
+    공급자 일봉 다운로드를 주기적으로 받아 틱으로 돌려줍니다 (장중에는 오늘 봉의 종가가 현재가).
+    요청이 실패한 묶음은 건너뛰고 다음 주기에 다시 받습니다.
+    """
+    provider = get_provider()
+    while True:
+        start = time.monotonic()
+        for i in range(0, len(symbols), batch_size):
+            part = symbols[i:i + batch_size]
+            try:
+                data = provider.download(part, period='5d')
+            except Exception as e:
+                print(f"현재가 수집 실패 ({len(part)}개): {e}")
+                continue
+            if data is None or data.empty:
+                continue
+            for s in part:
+                if s in data.columns.get_level_values(0):
+                    close = data[s]['Close'].dropna()
+                    if not close.empty:
+                        yield s, float(close.iloc[-1])
+        time.sleep(max(0.0, interval - (time.monotonic() - start)))
+
+
+def run(ranker, feed, snapshot_seconds=SNAPSHOT_SECONDS, max_seconds=None, path=INTRADAY_DB_PATH):
+    """
+    피드의 틱을 ranker 에 반영하면서 snapshot_seconds 마다 스냅숏을 path(intraday_rs.db)에 게시합니다.
+    max_seconds 가 지나거나 피드가 끝나면 마지막 스냅숏을 게시하고 반환합니다.
+    반환값: (처리한 틱 수, 경과 초)
+    """
+    conn = connect_db(path)
+    start = last = time.monotonic()
+    n0 = ranker.ticks
+    try:
+        for symbol, price in feed:
+            ranker.update(symbol, price)
+            now = time.monotonic()
+            if now - last >= snapshot_seconds:
+                publish_snapshot(conn, ranker.snapshot())
+                ticks = ranker.ticks - n0
+                print(f" > 스냅숏 게시: 틱 {ticks}개 ({ticks / (now - start):,.0f}/s), 종목 {len(ranker)}개")
+                last = now
+            if max_seconds and now - start >= max_seconds:
+                break
+    finally:
+        publish_snapshot(conn, ranker.snapshot())
+        conn.close()
+    return ranker.ticks - n0, time.monotonic() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="장중 가격으로 RS 점수를 증분 갱신해 intraday_rs 에 게시")
+    parser.add_argument('--feed', choices=['replay', 'poll'], default='poll',
+                        help="replay: 무작위 보행 재현 피드 (네트워크 없음), poll: 공급자에서 현재가 주기 수집")
+    parser.add_argument('--ticks', type=int, default=None, help="replay 피드의 틱 수 (기본: 끝없이)")
+    parser.add_argument('--seconds', type=float, default=None, help="이 시간이 지나면 종료")
+    parser.add_argument('--snapshot-seconds', type=float, default=SNAPSHOT_SECONDS)
+    args = parser.parse_args()
+
+    db_conn = connect_readonly()
+    price_conn = get_price_conn()
+    try:
+        symbols = list(load_universe(db_conn))
+        ranker = build_ranker(price_conn, db_conn, symbols)
+    finally:
+        price_conn.close()
+        db_conn.close()
+    print(f"--- 장중 RS 시작: 종목 {len(ranker)}개, 피드 {args.feed} ---")
+
+    feed = replay_feed(ranker.price, args.ticks) if args.feed == 'replay' else poll_feed(list(ranker.price))
+    n, seconds = run(ranker, feed, args.snapshot_seconds, args.seconds)
+    print(f"--- 종료: 틱 {n}개, {seconds:.1f}초 ({n / seconds if seconds else 0:,.0f}/s) ---")
@@ -0,0 +1,243 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from fetch_engine import error_category
+from providers import get_provider
+
+# 일봉 OHLCV 로컬 저장소 (ibd_system.db 와 분리된 사이드 파일)
+# GitHub Actions 에서는 actions/cache 로 실행 간에 보존합니다.
+PRICE_DB = 'price_store.db'
+HISTORY_PERIOD = '1y'
+LOOKBACK_DAYS = 365
+# 겹치는 봉의 종가 상대 오차가 이 값을 넘으면 분할/배당 수정으로 보고 전체 재수집
+OVERLAP_TOLERANCE = 1e-4
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def get_price_conn(path=PRICE_DB):
+    # 샤드 프로세스가 같은 저장소에 동시에 쓰므로 WAL + 잠금 대기
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_prices (
+            symbol TEXT NOT NULL,
+            date TEXT NOT NULL,
+            open REAL, high REAL, low REAL, close REAL, volume REAL,
+            PRIMARY KEY (symbol, date)
+        ) WITHOUT ROWID
+    """)
+    # 종목별 마지막 저장일(last_date)과 그 직전 봉(prev_date)을 기록
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS price_sync (
+            symbol TEXT PRIMARY KEY,
+            last_date TEXT,
+            prev_date TEXT,
+            synced_at TEXT
+        )
+    """)
+    return conn
+
+
+def get_sync_state(conn, symbols):
+    rows = []
+    for i in range(0, len(symbols), 500):
+        part = symbols[i:i + 500]
+        q = f"SELECT symbol, last_date, prev_date, synced_at FROM price_sync WHERE symbol IN ({','.join('?' * len(part))})"
+        rows.extend(conn.execute(q, part).fetchall())
+    return {r[0]: {'last_date': r[1], 'prev_date': r[2], 'synced_at': r[3]} for r in rows}
+
+
+def _extract(data, symbol):
+    """yf.download 결과에서 한 종목의 OHLCV 를 꺼냅니다 (단일/멀티 인덱스 모두 처리)."""
+    if data is None or data.empty:
+        return pd.DataFrame()
+    if isinstance(data.columns, pd.MultiIndex):
+        if symbol not in data.columns.get_level_values(0):
+            return pd.DataFrame()
+        hist = data[symbol]
+    else:
+        hist = data
+    return hist[[c for c in PRICE_COLUMNS if c in hist.columns]].dropna()
+
+
+def _download(symbols, **kwargs):
+    return get_provider().download(symbols, threads=True, **kwargs)
+
+
+def download_prices(symbols, **kwargs):
+    """워커 풀 안에서 호출되는 버전: 외부에서 이미 병렬화하므로 내부 스레드는 끔"""
+    return get_provider().download(symbols, threads=False, timeout=kwargs.pop('timeout', 20), **kwargs)
+
+
+def _write_bars(conn, symbol, hist, replace=False):
+    if replace:
+        conn.execute("DELETE FROM daily_prices WHERE symbol = ?", (symbol,))
+    # iterrows 대신 배열 단위로 변환 (신규 종목은 1년치 봉을 한 번에 씀)
+    values = hist[PRICE_COLUMNS].to_numpy(dtype=float).tolist()
+    rows = [(symbol, d, *v) for d, v in zip(hist.index.strftime('%Y-%m-%d'), values)]
+    conn.executemany("INSERT OR REPLACE INTO daily_prices VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    last_two = conn.execute(
+        "SELECT date FROM daily_prices WHERE symbol = ? ORDER BY date DESC LIMIT 2", (symbol,)
+    ).fetchall()
+    last_date = last_two[0][0] if last_two else None
+    prev_date = last_two[1][0] if len(last_two) > 1 else last_date
+    conn.execute(
+        "INSERT OR REPLACE INTO price_sync VALUES (?, ?, ?, ?)",
+        (symbol, last_date, prev_date, datetime.now().strftime('%Y-%m-%d'))
+    )
+
+
+def _mark_synced(conn, symbol, state):
+    conn.execute(
+        "INSERT OR REPLACE INTO price_sync VALUES (?, ?, ?, ?)",
+        (symbol, state.get('last_date'), state.get('prev_date'), datetime.now().strftime('%Y-%m-%d'))
+    )
+
+
+def plan_sync(conn, symbols, batch_size=30):
+    """
+    저장소에 없는 구간만 받도록 다운로드 작업 목록을 만듭니다.
+    - 신규 종목: period=1y 전체 수집
+    - 기존 종목: 직전 봉(prev_date)부터 수집 (겹치는 봉으로 수정주가 여부 확인)
+    - 오늘 이미 동기화된 종목은 건너뜁니다 (재실행 시 중복 수집 방지)
+    반환값: (state, [(group, download kwargs), ...])
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    state = get_sync_state(conn, symbols)
+
+    full_fetch, by_anchor = [], {}
+    for s in symbols:
+        st = state.get(s)
+        if st and st['synced_at'] == today:
+            continue
+        if not st or not st['last_date']:
+            full_fetch.append(s)
+        else:
+            by_anchor.setdefault(st['prev_date'], []).append(s)
+
+    jobs = []
+    for anchor, group in by_anchor.items():
+        for i in range(0, len(group), batch_size):
+            jobs.append((group[i:i + batch_size], {'start': anchor}))
+    for i in range(0, len(full_fetch), batch_size):
+        jobs.append((full_fetch[i:i + batch_size], {'period': HISTORY_PERIOD}))
+    return state, jobs
+
+
+def plan_restate(conn, symbols, batch_size=30):
+    """
+    수정주가로 과거 가격이 바뀐 종목의 재수집 작업.
+    저장된 가장 오래된 봉부터 다시 받아 교체하므로 1년보다 긴 이력(backtest --backfill)도 유지됩니다.
+    """
+    earliest = {}
+    for i in range(0, len(symbols), 500):
+        part = symbols[i:i + 500]
+        q = (f"SELECT symbol, MIN(date) FROM daily_prices "
+             f"WHERE symbol IN ({','.join('?' * len(part))}) GROUP BY symbol")
+        earliest.update(conn.execute(q, part).fetchall())
+    # 시작일이 비슷한 종목끼리 묶고, 묶음의 가장 이른 시작일로 요청
+    ordered = sorted(symbols, key=lambda s: earliest.get(s) or '')
+    jobs = []
+    for i in range(0, len(ordered), batch_size):
+        group = ordered[i:i + batch_size]
+        start = min((earliest[s] for s in group if earliest.get(s)), default=None)
+        jobs.append((group, {'start': start} if start else {'period': HISTORY_PERIOD}))
+    return jobs
+
+
+def apply_download(conn, group, kwargs, data, state, metrics=None, replace=False):
+    """
+    다운로드 결과를 저장소에 반영합니다.
+    증분 수집에서 겹치는 봉의 종가가 달라진 종목(분할/배당 수정)은 저장하지 않고
+    전체 재수집 대상으로 돌려줍니다.
+    replace 이거나 기간(period) 수집이면 종목의 기존 봉을 받은 봉으로 교체합니다.
+    """
+    restated = []
+    anchor = kwargs.get('start')
+    for s in group:
+        hist = _extract(data, s)
+        if hist.empty:
+            # 데이터가 없는 종목도 동기화 시각을 기록해 당일 재요청을 막음
+            _mark_synced(conn, s, state.get(s, {}))
+            if metrics:
+                metrics.count('price_empty')
+            continue
+        if replace or anchor is None:
+            _write_bars(conn, s, hist, replace=True)
+            continue
+        stored = conn.execute(
+            "SELECT close FROM daily_prices WHERE symbol = ? AND date = ?", (s, anchor)
+        ).fetchone()
+        anchor_ts = pd.Timestamp(anchor)
+        if stored and anchor_ts in hist.index:
+            new_close = float(hist.loc[anchor_ts, 'Close'])
+            if abs(new_close - stored[0]) > abs(stored[0]) * OVERLAP_TOLERANCE:
+                # 과거 가격이 재작성됨 -> 전체 재수집 대상
+                restated.append(s)
+                continue
+        _write_bars(conn, s, hist)
+    conn.commit()
+    return restated
+
+
+def sync_prices(conn, symbols, engine=None, download=None, metrics=None):
+    """
+    plan_sync 로 만든 다운로드 작업을 실행하고 결과를 저장소에 반영합니다.
+    engine(FetchEngine)이 주어지면 작업을 워커 풀에서 동시에 실행하고,
+    저장은 호출한 스레드에서만 수행합니다.
+    metrics(RunMetrics)가 주어지면 요청/실패/수정주가 재수집 건수를 기록합니다.
+    반환값: (요청한 종목 수, 실패한 작업 수)
+    """
+    state, jobs = plan_sync(conn, symbols)
+    requested, failed, restated = 0, 0, []
+
+    def run(jobs, replace=False):
+        nonlocal requested, failed
+        if engine is None:
+            fetch = download or _download
+            results = ((job, fetch(job[0], **job[1]), None) for job in jobs)
+        else:
+            fetch = download or download_prices
+            results = engine.map(lambda job: engine.call(fetch, job[0], **job[1]), jobs)
+        for (group, kwargs), data, err in results:
+            requested += len(group)
+            if metrics:
+                metrics.count('price_jobs')
+                metrics.count('price_symbols', len(group))
+            if err is not None:
+                failed += 1
+                print(f"Price Fetch Error ({len(group)}개): {err}")
+                if metrics:
+                    metrics.failure(f"price:{error_category(err)}")
+                continue
+            restated.extend(apply_download(conn, group, kwargs, data, state, metrics, replace))
+
+    run(jobs)
+    if restated:
+        if metrics:
+            metrics.count('price_restated', len(restated))
+        retry = list(restated)
+        restated.clear()
+        run(plan_restate(conn, retry), replace=True)
+    return requested, failed
+
+
+def load_panel(conn, symbols, lookback_days=LOOKBACK_DAYS, fields=('close', 'volume')):
+    """
+    최근 lookback_days 의 일봉을 (날짜 x 종목) 패널로 반환합니다.
+    반환값: {field: DataFrame} - 종목에 없는 날짜는 NaN
+    """
+    start = (datetime.now() - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+    cols = ', '.join(fields)
+    frames = []
+    for i in range(0, len(symbols), 500):
+        part = symbols[i:i + 500]
+        q = (f"SELECT symbol, date, {cols} FROM daily_prices "
+             f"WHERE symbol IN ({','.join('?' * len(part))}) AND date >= ?")
+        frames.append(pd.read_sql(q, conn, params=part + [start]))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['symbol', 'date', *fields])
+    df['date'] = pd.to_datetime(df['date'])
+    return {f: df.pivot(index='date', columns='symbol', values=f).sort_index() for f in fields}
@@ -0,0 +1,225 @@
+import io
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from ftplib import FTP
+
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+
+# 데이터 공급자 선택: live(yfinance/GitHub/나스닥 FTP) 또는 replay(네트워크 없는 재현용)
+DATA_PROVIDER = os.environ.get('DATA_PROVIDER', 'live')
+
+SECTOR_SOURCES = {
+    'github': "https://raw.githubusercontent.com/rreichel3/US-Stock-Symbols/main/all_tickers.csv",
+    'nasdaq_screener': "https://raw.githubusercontent.com/yumoxu/stock-market-analysis/master/data/nasdaq_screener.csv",
+}
+SECTORS = ['Technology', 'Health Care', 'Finance', 'Consumer Discretionary', 'Industrials',
+           'Energy', 'Utilities', 'Real Estate', 'Basic Materials', 'Telecommunications']
+
+
+class LiveProvider:
+    """
+    실제 네트워크 공급자.
+    - 가격: yf.download / 재무: yf.Ticker().info / 상세: yf.Ticker 재무제표 속성
+    - 섹터 맵: GitHub CSV / 종목 디렉터리: ftp.nasdaqtrader.com
+    """
+
+    def download(self, symbols, threads=False, **kwargs):
+        return yf.download(symbols, interval="1d", progress=False, group_by='ticker', threads=threads, **kwargs)
+
+    def get_info(self, symbol):
+        return yf.Ticker(symbol).info
+
+    def ticker(self, symbol):
+        """재무제표(quarterly_income_stmt 등)와 info 속성을 가진 객체"""
+        return yf.Ticker(symbol)
+
+    def sector_table(self, source):
+        """Symbol / Sector 컬럼을 가진 섹터 원본 표"""
+        if source == 'nasdaq_screener':
+            s = requests.get(SECTOR_SOURCES[source]).content
+            return pd.read_csv(io.StringIO(s.decode('utf-8')))
+        return pd.read_csv(SECTOR_SOURCES[source])
+
+    def symbol_directory(self, filename):
+        """나스닥 심볼 디렉터리 파일(nasdaqlisted.txt / otherlisted.txt)을 받으면서 한 줄씩 돌려줍니다."""
+        with FTP('ftp.nasdaqtrader.com') as ftp:
+            ftp.login()
+            ftp.cwd('symboldirectory')
+            ftp.sendcmd('TYPE A')
+            with ftp.transfercmd(f'RETR {filename}') as sock, sock.makefile('r', encoding='latin-1') as fp:
+                for line in fp:
+                    yield line.rstrip('\r\n')
+            ftp.voidresp()
+
+
+class ReplayThrottleError(Exception):
+    def __init__(self):
+        super().__init__("429 Too Many Requests (replay)")
+
+
+class _ReplayTicker:
+    """yf.Ticker 의 재무제표/info 속성을 흉내 내는 객체 (속성 접근마다 요청 1회)"""
+
+    def __init__(self, provider, symbol):
+        self._provider = provider
+        self._symbol = symbol
+
+    def _statement(self, items, n_periods, freq):
+        self._provider._request()
+        rng = np.random.default_rng(zlib.crc32(f"{self._symbol}|{freq}".encode()))
+        end = self._provider.dates[-1]
+        periods = pd.date_range(end=end, periods=n_periods, freq='QE' if freq == 'Q' else 'YE')[::-1]
+        base = rng.uniform(50, 5000, len(items))
+        growth = rng.normal(0.03 if freq == 'Q' else 0.1, 0.08, (len(items), n_periods))
+        values = base[:, None] / np.cumprod(1 + growth, axis=1)
+        return pd.DataFrame(values, index=items, columns=periods)
+
+    @property
+    def quarterly_income_stmt(self):
+        return self._statement(['Total Revenue', 'Operating Income', 'Net Income', 'EBITDA', 'Basic EPS'], 5, 'Q')
+
+    @property
+    def income_stmt(self):
+        return self._statement(['Total Revenue', 'Operating Income', 'Net Income', 'EBITDA', 'Basic EPS'], 4, 'A')
+
+    @property
+    def quarterly_balance_sheet(self):
+        return self._statement(['Total Assets', 'Total Liabilities Net Minority Interest', 'Stockholders Equity'], 5, 'Q')
+
+    @property
+    def balance_sheet(self):
+        return self._statement(['Total Assets', 'Total Liabilities Net Minority Interest', 'Stockholders Equity'], 4, 'A')
+
+    @property
+    def info(self):
+        info = self._provider.get_info(self._symbol)
+        return dict(info, longName=f"{self._symbol} Corp", longBusinessSummary=f"{self._symbol} replay profile")
+
+
+class ReplayProvider:
+    """
+    네트워크 없이 파이프라인을 점검/벤치마크하기 위한 재현용 공급자.
+    - 가격은 종목명에서 만든 시드로 생성되므로 같은 종목은 항상 같은 시계열을 돌려줍니다.
+    - price_db 를 주면 기록된 price_store.db 의 일봉을 그대로 재생합니다 (없는 종목만 합성).
+    - 요청마다 latency 범위의 지연을 넣고 throttle_rate 확률로 429 오류를 냅니다.
+    """
+
+    def __init__(self, symbols=(), n_days=260, latency=(0.005, 0.03), throttle_rate=0.05, seed=0, price_db=None):
+        self.symbols = list(symbols)
+        self.dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n_days)
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.recorded = _load_recorded(price_db) if price_db else {}
+
+    def _request(self):
+        with self.lock:
+            self.calls += 1
+            delay = self.rng.uniform(*self.latency)
+            throttled = self.rng.random() < self.throttle_rate
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            raise ReplayThrottleError()
+
+    def history(self, symbol):
+        if symbol in self.recorded:
+            return self.recorded[symbol]
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+        n = len(self.dates)
+        close = 20 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, n)))
+        volume = rng.integers(10_000, 5_000_000, n).astype(float)
+        return pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99,
+                             'Close': close, 'Volume': volume}, index=self.dates)
+
+    def download(self, symbols, start=None, period=None, **kwargs):
+        """yf.download(group_by='ticker') 와 같은 (ticker, field) 멀티 인덱스 DataFrame 을 반환"""
+        self._request()
+        frames = {}
+        for s in symbols:
+            hist = self.history(s)
+            if start is not None:
+                hist = hist[hist.index >= pd.Timestamp(start)]
+            frames[s] = hist
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+    def get_info(self, symbol):
+        self._request()
+        h = zlib.crc32(symbol.encode())
+        if h % 10 == 0:
+            return {}  # 섹터를 돌려주지 않는 종목
+        return {'sector': SECTORS[h % len(SECTORS)],
+                'returnOnEquity': (h % 400) / 1000 - 0.1,
+                'profitMargins': (h % 300) / 1000 - 0.05,
+                'revenueGrowth': (h % 500) / 1000 - 0.1,
+                'earningsQuarterlyGrowth': (h % 700) / 1000 - 0.2}
+
+    def ticker(self, symbol):
+        return _ReplayTicker(self, symbol)
+
+    def sector_table(self, source):
+        # 소스마다 일부 종목만 섹터를 알려 주도록 나눔 (소스 병합 로직 점검용)
+        slot = list(SECTOR_SOURCES).index(source)
+        rows = [(s, SECTORS[zlib.crc32(s.encode()) % len(SECTORS)])
+                for s in self.symbols if zlib.crc32(s.encode()) % 3 != slot]
+        return pd.DataFrame(rows, columns=['Symbol', 'Sector'])
+
+    def symbol_directory(self, filename):
+        # 나스닥 파일 형식: '|' 구분, 마지막 줄은 파일 생성 정보
+        nasdaq = filename == 'nasdaqlisted.txt'
+        if nasdaq:
+            header = 'Symbol|Security Name|Market Category|Test Issue|Financial Status|Round Lot Size|ETF|NextShares'
+            row = "{s}|{s} Corp - Common Stock|Q|N|N|100|N|N"
+        else:
+            header = 'ACT Symbol|Security Name|Exchange|CQS Symbol|ETF|Round Lot Size|Test Issue|NASDAQ Symbol'
+            row = "{s}|{s} Corp Common Stock|N|{s}|N|100|N|{s}"
+        body = [row.format(s=s) for i, s in enumerate(self.symbols) if (i % 2 == 0) == nasdaq]
+        return [header, *body, f"File Creation Time: {pd.Timestamp.today():%m%d%Y%H:%M}||||||"]
+
+
+def _load_recorded(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        df = pd.read_sql("SELECT symbol, date, open, high, low, close, volume FROM daily_prices", conn)
+    finally:
+        conn.close()
+    df.columns = ['symbol', 'Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+    df['Date'] = pd.to_datetime(df['Date'])
+    return {sym: g.set_index('Date').drop(columns='symbol') for sym, g in df.groupby('symbol', sort=False)}
+
+
+_provider = None
+
+
+def get_provider():
+    """현재 공급자. 처음 호출 시 DATA_PROVIDER 환경 변수로 결정합니다."""
+    global _provider
+    if _provider is None:
+        if DATA_PROVIDER == 'replay':
+            _provider = ReplayProvider(symbols=_replay_symbols(), latency=(0, 0), throttle_rate=0)
+        else:
+            _provider = LiveProvider()
+    return _provider
+
+
+def set_provider(provider):
+    """벤치마크/점검 스크립트에서 공급자를 교체합니다. 이전 공급자를 반환합니다."""
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
+
+
+def _replay_symbols():
+    if os.path.exists('tickers.txt'):
+        with open('tickers.txt') as f:
+            return [line.strip().upper() for line in f if line.strip()]
+    return []
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+# rs_raw 앵커: 최근 63 / 126 / 189 거래일 전 종가 + 1년 구간 첫 종가
+RS_ANCHORS = (63, 126, 189)
+AD_WINDOW = 65
+MIN_HISTORY = 150
+AD_GRADES = [(1.5, 'A'), (1.2, 'B'), (0.9, 'C'), (0.7, 'D')]
+# 미너비니 트렌드 템플릿
+MA_WINDOWS = (50, 150, 200)
+MA200_RISING_LAG = 21   # 200일 이평이 약 1개월 전보다 높아야 함
+YEAR_BARS = 252
+
+
+def bottom_align(close, volume):
+    """
+    (날짜 x 종목) 배열에서 종목별 유효 봉을 아래쪽으로 모읍니다.
+    종목마다 상장일/거래정지일이 달라도 마지막 행이 각 종목의 최신 봉이 되어
+    hist.dropna().iloc[-k] 와 같은 위치 연산을 한 번에 할 수 있습니다.
+    반환값: (close, volume, 종목별 유효 봉 수)
+    """
+    valid = ~(np.isnan(close) | np.isnan(volume))
+    close = np.where(valid, close, np.nan)
+    volume = np.where(valid, volume, np.nan)
+    # False(결측)가 위로, True(유효)가 원래 순서를 유지한 채 아래로 정렬됨
+    order = np.argsort(valid, axis=0, kind='stable')
+    return (np.take_along_axis(close, order, axis=0),
+            np.take_along_axis(volume, order, axis=0),
+            valid.sum(axis=0))
+
+
+def tail_row(close, k):
+    """아래 정렬된 패널의 close[-k]. 패널이 k 봉보다 짧으면 NaN (이력 부족 종목으로 마스킹됨)"""
+    if k > close.shape[0]:
+        return np.full(close.shape[1], np.nan)
+    return close[-k]
+
+
+def rs_raw_from_panel(close, counts):
+    """rs_raw = 3개월 수익률 x2 + 6개월 + 9개월 + 12개월 (가격 비율 합)"""
+    n_rows, n_cols = close.shape
+    price = close[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = price / tail_row(close, RS_ANCHORS[0]) * 2
+        for k in RS_ANCHORS[1:]:
+            rs = rs + price / tail_row(close, k)
+        first = close[np.clip(n_rows - counts, 0, n_rows - 1), np.arange(n_cols)]
+        rs = rs + price / first
+    rs[counts < max(RS_ANCHORS)] = np.nan
+    return rs
+
+
+def ad_ratio_from_panel(close, volume):
+    """최근 65봉에서 상승일 거래량 합 / 하락일 거래량 합"""
+    c = close[-AD_WINDOW:]
+    v = volume[-AD_WINDOW:][1:]
+    change = np.diff(c, axis=0)
+    up_vol = np.where(change > 0, v, 0).sum(axis=0)
+    down_vol = np.where(change < 0, v, 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(down_vol > 0, up_vol / down_vol, np.nan)
+
+
+def ad_grade(ratio, counts):
+    grades = np.select([ratio >= t for t, _ in AD_GRADES], [g for _, g in AD_GRADES], 'E')
+    # 데이터 부족(20봉 미만)이거나 하락일 거래량이 없으면 'C' (calculate_acc_dist_rating 과 동일)
+    return np.where(np.isnan(ratio) | (counts < 20), 'C', grades)
+
+
+def tail_mean(close, window, lag=0):
+    """
+    아래 정렬된 패널에서 (최신 봉 - lag) 시점의 window 봉 이동평균.
+    이력이 window + lag 봉보다 짧은 종목은 구간에 NaN 이 섞여 NaN 이 됩니다.
+    """
+    n_rows = close.shape[0]
+    if window + lag > n_rows:
+        return np.full(close.shape[1], np.nan)
+    return close[n_rows - window - lag:n_rows - lag].mean(axis=0)
+
+
+def trend_inputs_from_panel(close):
+    """트렌드 템플릿 판정에 필요한 이동평균과 52주 고가/저가(종가 기준)"""
+    year = close[-YEAR_BARS:]
+    out = {f'ma{w}': tail_mean(close, w) for w in MA_WINDOWS}
+    out['ma200_1m'] = tail_mean(close, 200, MA200_RISING_LAG)
+    # fmax/fmin 은 NaN 을 건너뛰므로 상장 1년 미만 종목은 가용 구간 기준
+    out['high_52w'] = np.fmax.reduce(year, axis=0)
+    out['low_52w'] = np.fmin.reduce(year, axis=0)
+    return out
+
+
+def trend_template(df, rs_min=80):
+    """
+    price / 이동평균 / 52주 고저 / rs_score 컬럼으로 트렌드 템플릿 8개 조건을 판정합니다.
+    값이 없으면(NaN) 해당 조건은 불통과입니다.
+    """
+    price = df['price']
+    checks = pd.DataFrame({
+        'tt_above_ma150_200': (price > df['ma150']) & (price > df['ma200']),
+        'tt_ma150_above_ma200': df['ma150'] > df['ma200'],
+        'tt_ma200_rising': df['ma200'] > df['ma200_1m'],
+        'tt_ma50_above_ma150_200': (df['ma50'] > df['ma150']) & (df['ma50'] > df['ma200']),
+        'tt_above_low_30': price >= df['low_52w'] * 1.3,
+        'tt_near_high_25': price >= df['high_52w'] * 0.75,
+        'tt_rs_80': df['rs_score'] >= rs_min,
+        'tt_above_ma50': price > df['ma50'],
+    }, index=df.index).astype(int)
+    checks['tt_score'] = checks.sum(axis=1)
+    checks['tt_pass'] = (checks['tt_score'] == len(checks.columns) - 1).astype(int)
+    return checks
+
+
+def compute_ratings(close, volume, min_history=MIN_HISTORY):
+    """
+    정렬된 (날짜 x 종목) 종가/거래량 패널로 전 종목의 price, rs_raw, AD 비율/등급을 계산합니다.
+    트렌드 템플릿용 이동평균(50/150/200일, 1개월 전 200일)과 52주 고가/저가도 함께 계산합니다.
+    이력이 부족한 종목은 제외하지 않고 valid=False 로 마스킹합니다.
+    """
+    symbols = close.columns
+    volume = volume.reindex(index=close.index, columns=symbols)
+    c, v, counts = bottom_align(close.to_numpy(dtype=float), volume.to_numpy(dtype=float))
+
+    rs = rs_raw_from_panel(c, counts)
+    ratio = ad_ratio_from_panel(c, v)
+    valid = (counts >= min_history) & ~np.isnan(rs)
+    return pd.DataFrame({
+        'price': c[-1],
+        'rs_raw': np.where(valid, rs, np.nan),
+        'ad_ratio': ratio,
+        'ad_rating': ad_grade(ratio, counts),
+        **trend_inputs_from_panel(c),
+        'n_bars': counts,
+        'valid': valid,
+    }, index=symbols)
+
+
+if __name__ == "__main__":
+    # 벤치마크: 합성 패널에서 종목별 루프와 벡터화 엔진을 비교
+    import time
+    from providers import ReplayProvider
+    from update_data import calculate_acc_dist_rating
+
+    provider = ReplayProvider([f"S{i:04d}" for i in range(6600)])
+    histories = {s: provider.history(s) for s in provider.symbols}
+    close = pd.DataFrame({s: h['Close'] for s, h in histories.items()})
+    volume = pd.DataFrame({s: h['Volume'] for s, h in histories.items()})
+
+    t = time.perf_counter()
+    loop = {}
+    for s, hist in histories.items():
+        cl = hist['Close']
+        now = cl.iloc[-1]
+        loop[s] = ((now/cl.iloc[-63]*2) + (now/cl.iloc[-126]) + (now/cl.iloc[-189]) + (now/cl.iloc[0]),
+                   calculate_acc_dist_rating(hist))
+    t_loop = time.perf_counter() - t
+
+    t = time.perf_counter()
+    ratings = compute_ratings(close, volume)
+    t_vec = time.perf_counter() - t
+
+    same = all(np.isclose(ratings.at[s, 'rs_raw'], r) and ratings.at[s, 'ad_rating'] == g for s, (r, g) in loop.items())
+    print(f"종목별 루프: {t_loop:.2f}s | 벡터화: {t_vec:.3f}s | 결과 일치: {same}")
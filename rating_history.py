@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from security_master import ensure_security_ids
+
+# 실행마다 등급을 날짜별로 누적하는 테이블 (security_master.security_id 기준)
+HISTORY_COLUMNS = ['rs_score', 'smr_grade', 'ad_rating', 'industry_rs_score', 'price']
+
+
+def init_history(conn):
+    """
+    repo1_results 를 이력 테이블로 사용합니다.
+    예전 스키마(security_id, rs_score, calc_date)만 있으면 나머지 컬럼을 추가합니다.
+    """
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(repo1_results)")]
+    empty = not cols or conn.execute("SELECT COUNT(*) FROM repo1_results").fetchone()[0] == 0
+    if cols and empty and set(HISTORY_COLUMNS) - set(cols):
+        # 비어 있는 예전 테이블은 정수 키 스키마로 다시 만듦
+        conn.execute("DROP TABLE repo1_results")
+        cols = []
+    if not cols:
+        conn.execute("""
+            CREATE TABLE repo1_results (
+                security_id INTEGER NOT NULL,
+                calc_date TEXT NOT NULL,
+                rs_score INTEGER,
+                smr_grade TEXT,
+                ad_rating TEXT,
+                industry_rs_score INTEGER,
+                price REAL,
+                PRIMARY KEY (security_id, calc_date)
+            ) WITHOUT ROWID
+        """)
+    else:
+        types = {'smr_grade': 'TEXT', 'ad_rating': 'TEXT', 'industry_rs_score': 'INTEGER', 'price': 'REAL'}
+        for c, t in types.items():
+            if c not in cols:
+                conn.execute(f"ALTER TABLE repo1_results ADD COLUMN {c} {t}")
+    # 날짜별 스크린(신고가/상승폭)용 인덱스
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_repo1_date_rs ON repo1_results (calc_date, rs_score)")
+    conn.commit()
+
+
+def append_history(conn, final_df, calc_date=None):
+    """이번 실행의 등급을 calc_date 로 기록합니다 (같은 날 재실행 시 덮어씀)."""
+    calc_date = calc_date or datetime.now().strftime('%Y-%m-%d')
+    init_history(conn)
+    ids = ensure_security_ids(conn, final_df['symbol'].tolist())
+    rows = [
+        (ids[r.symbol], calc_date, int(r.rs_score), str(r.smr_grade), r.ad_rating,
+         int(r.industry_rs_score), float(r.price))
+        for r in final_df.itertuples(index=False) if r.symbol in ids
+    ]
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO repo1_results "
+            "(security_id, calc_date, rs_score, smr_grade, ad_rating, industry_rs_score, price) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+    return len(rows)
+
+
+def latest_calc_date(conn):
+    return conn.execute("SELECT MAX(calc_date) FROM repo1_results").fetchone()[0]
+
+
+def rs_line(conn, symbol, days=60):
+    """한 종목의 최근 days 일 RS 점수 / 가격 추이"""
+    start = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    return pd.read_sql("""
+        SELECT h.calc_date, h.rs_score, h.price
+        FROM security_master m
+        JOIN repo1_results h ON h.security_id = m.security_id
+        WHERE m.symbol = ? AND h.calc_date >= ?
+        ORDER BY h.calc_date
+    """, conn, params=[symbol, start])
+
+
+def new_rs_highs(conn, calc_date=None, lookback_days=252):
+    """calc_date 의 RS 점수가 직전 lookback_days 일 최고치를 넘은 종목"""
+    calc_date = calc_date or latest_calc_date(conn)
+    start = (datetime.fromisoformat(calc_date) - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+    return pd.read_sql("""
+        SELECT m.symbol, t.rs_score, MAX(h.rs_score) AS prev_high, t.price
+        FROM repo1_results t
+        JOIN repo1_results h
+          ON h.security_id = t.security_id AND h.calc_date >= ? AND h.calc_date < t.calc_date
+        JOIN security_master m ON m.security_id = t.security_id
+        WHERE t.calc_date = ?
+        GROUP BY t.security_id
+        HAVING t.rs_score > MAX(h.rs_score)
+        ORDER BY t.rs_score DESC
+    """, conn, params=[start, calc_date])
+
+
+def top_rs_gainers(conn, days=7, limit=20, calc_date=None):
+    """calc_date 와 days 일 전(가장 가까운 이전 기록일) 사이 RS 점수 상승폭 상위 종목"""
+    calc_date = calc_date or latest_calc_date(conn)
+    base = (datetime.fromisoformat(calc_date) - timedelta(days=days)).strftime('%Y-%m-%d')
+    return pd.read_sql("""
+        SELECT m.symbol, p.rs_score AS rs_before, t.rs_score AS rs_now,
+               t.rs_score - p.rs_score AS rs_change, t.price
+        FROM repo1_results t
+        JOIN repo1_results p
+          ON p.security_id = t.security_id
+         AND p.calc_date = (SELECT MAX(calc_date) FROM repo1_results WHERE calc_date <= ?)
+        JOIN security_master m ON m.security_id = t.security_id
+        WHERE t.calc_date = ?
+        ORDER BY rs_change DESC
+        LIMIT ?
+    """, conn, params=[base, calc_date, limit])
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from fundamentals_cache import ERROR_TTL_DAYS, FUNDAMENTALS_TTL_DAYS, STATUS_TTL, load_fundamentals
+
+# 실행당 재무(yf.Ticker().info) 호출 상한. 가격은 예산과 관계없이 전 종목을 매일 갱신. 0 이면 제한 없음
+FUNDAMENTALS_BUDGET = int(os.environ.get('FUNDAMENTALS_BUDGET', 2000))
+# fetch 단계 시간 예산(초). 넘으면 남은 청크는 가격만 갱신하고 재무는 캐시를 사용. 0 이면 제한 없음
+FETCH_TIME_BUDGET = int(os.environ.get('FETCH_TIME_BUDGET', 0))
+
+# 등급 기준: 대시보드 기본 필터(가격 >= $10, RS >= 80)를 통과하는 종목이 1등급
+MIN_PRICE = 10
+LEADER_RS = 80
+# 2등급: 가격 조건을 만족하면서 주도주 후보(RS >= 60)이거나 거래대금이 충분한 종목
+WATCH_RS = 60
+LIQUID_DOLLAR_VOLUME = float(os.environ.get('LIQUID_DOLLAR_VOLUME', 5_000_000))
+# 평균 거래대금 계산 구간 (달력일, 약 20거래일)
+DOLLAR_VOLUME_DAYS = 30
+# 등급별 재무 캐시 TTL (정상 조회 결과 기준, 섹터 없음/오류는 fundamentals_cache 의 TTL 을 따름)
+TIER_TTL_DAYS = {1: 7, 2: FUNDAMENTALS_TTL_DAYS, 3: 90}
+
+
+def load_liquidity(price_conn, symbols, days=DOLLAR_VOLUME_DAYS):
+    """가격 저장소에서 종목별 최근 종가와 평균 거래대금을 {symbol: (price, dollar_volume)} 로 반환합니다."""
+    start = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    out = {}
+    for i in range(0, len(symbols), 500):
+        part = symbols[i:i + 500]
+        # MAX(date) 와 함께 쓴 close 는 마지막 봉의 값 (SQLite bare column)
+        q = (f"SELECT symbol, close, MAX(date), AVG(close * volume) FROM daily_prices "
+             f"WHERE symbol IN ({','.join('?' * len(part))}) AND date >= ? GROUP BY symbol")
+        for sym, close, _, dollar_volume in price_conn.execute(q, part + [start]):
+            out[sym] = (close, dollar_volume)
+    return out
+
+
+def load_rs_scores(conn):
+    """마지막으로 게시된 repo_results 의 RS 점수. 아직 게시 전이면 빈 dict"""
+    try:
+        return dict(conn.execute("SELECT symbol, rs_score FROM repo_results"))
+    except sqlite3.OperationalError:
+        return {}
+
+
+def assign_tiers(symbols, liquidity, rs_scores):
+    """
+    저장된 가격/거래대금/RS 로 종목을 3개 등급으로 나눕니다.
+    1: 주도주 (가격 >= MIN_PRICE, RS >= LEADER_RS)
+    2: 후보/유동 종목 (가격 >= MIN_PRICE 이고 RS >= WATCH_RS 또는 거래대금 >= LIQUID_DOLLAR_VOLUME)
+    3: 나머지 (저가주, 비유동 종목, 가격 데이터가 없는 종목)
+    """
+    tiers = {}
+    for s in symbols:
+        price, dollar_volume = liquidity.get(s, (None, None))
+        rs = rs_scores.get(s) or 0
+        if price is None or price < MIN_PRICE:
+            tiers[s] = 3
+        elif rs >= LEADER_RS:
+            tiers[s] = 1
+        elif rs >= WATCH_RS or (dollar_volume or 0) >= LIQUID_DOLLAR_VOLUME:
+            tiers[s] = 2
+        else:
+            tiers[s] = 3
+    return tiers
+
+
+def is_due(record, tier, now=None):
+    """등급별 TTL 로 본 재무 갱신 필요 여부"""
+    if not record or not record.get('fetched_at'):
+        return True
+    now = now or datetime.now()
+    status = record.get('status')
+    ttl = TIER_TTL_DAYS[tier] if status == 'ok' else STATUS_TTL.get(status, ERROR_TTL_DAYS)
+    return datetime.fromisoformat(record['fetched_at']) + timedelta(days=ttl) <= now
+
+
+class RefreshPlan:
+    """
+    한 번의 fetch 단계에서 재무를 호출할 종목 목록.
+    갱신이 필요한 종목을 (등급, 마지막 갱신 시각) 순으로 줄 세워 예산만큼만 고르므로
+    주도주가 먼저 갱신되고, 나머지는 오래된 순으로 실행마다 돌아가며 갱신됩니다.
+    시간 예산을 넘기면 이후 청크는 재무 호출 없이 캐시만 사용합니다.
+    """
+
+    def __init__(self, tiers, selected, time_budget=FETCH_TIME_BUDGET):
+        self.tiers = tiers
+        self.selected = set(selected)
+        self.deadline = time.monotonic() + time_budget if time_budget else None
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def due(self, symbol, record):
+        """등급별 TTL 로 본 재무 갱신 필요 여부"""
+        return is_due(record, self.tiers.get(symbol, 3))
+
+    def select(self, symbols, cache, metrics=None):
+        """refresh_fundamentals 에서 호출: 이번 청크에서 API 를 호출할 종목"""
+        due = [s for s in symbols if self.due(s, cache.get(s))]
+        chosen = [s for s in due if s in self.selected]
+        if chosen and self.expired():
+            if metrics:
+                metrics.count('fundamentals_deferred_time', len(chosen))
+            chosen = []
+        if metrics:
+            metrics.count('fundamentals_deferred', len(due) - len(chosen))
+        return chosen
+
+
+def build_refresh_plan(db_conn, price_conn, symbols, budget=FUNDAMENTALS_BUDGET, time_budget=FETCH_TIME_BUDGET,
+                       metrics=None):
+    """저장된 가격/RS/재무 갱신 시각으로 등급을 매기고 이번 실행의 재무 호출 대상을 고릅니다."""
+    tiers = assign_tiers(symbols, load_liquidity(price_conn, symbols), load_rs_scores(db_conn))
+    cache = load_fundamentals(db_conn, symbols)
+    now = datetime.now()
+    due = [s for s in symbols if is_due(cache.get(s), tiers[s], now)]
+    # 등급 순, 같은 등급에서는 한 번도 조회하지 않은 종목 -> 오래된 종목 순
+    due.sort(key=lambda s: (tiers[s], (cache.get(s) or {}).get('fetched_at') or ''))
+    selected = due[:budget] if budget else due
+
+    counts = {t: sum(1 for s in symbols if tiers[s] == t) for t in (1, 2, 3)}
+    picked = {t: sum(1 for s in selected if tiers[s] == t) for t in (1, 2, 3)}
+    if metrics:
+        for t in (1, 2, 3):
+            metrics.count(f'tier_{t}', counts[t])
+            metrics.count(f'tier_{t}_planned', picked[t])
+    print(f"--- 갱신 계획: 등급별 종목 {counts}, 재무 갱신 필요 {len(due)}개 중 {len(selected)}개 호출 "
+          f"(등급별 {picked}, 예산 {budget or '무제한'}회) ---")
+    return RefreshPlan(tiers, selected, time_budget)
@@ -1,62 +1,93 @@
-import pandas as pd
-from io import StringIO
-from ftplib import FTP
+import argparse
+from db_store import DB_PATH, connect_db, leave_wal
+from providers import get_provider
+from security_master import MAX_DELIST_RATIO, get_sector_master_map, sectors_stale, sync_universe, save_sectors
 
-def get_nasdaq_ftp_data(filename):
-    try:
-        ftp = FTP('ftp.nasdaqtrader.com')
-        ftp.login()
-        ftp.cwd('symboldirectory')
-        
-        lines = []
-        ftp.retrlines(f'RETR {filename}', lines.append)
-        ftp.quit()
-        
-        data = "\n".join(lines)
-        # 나스닥 파일은 구분자가 '|' 입니다.
-        df = pd.read_csv(StringIO(data), sep='|')
-        
-        # 마지막 줄(파일 생성 정보) 제거 및 유효한 심볼만 추출
-        if 'Symbol' in df.columns:
-            return df['Symbol'].dropna().astype(str).tolist()
-        elif 'ACT Symbol' in df.columns: # otherlisted.txt는 컬럼명이 다를 수 있음
-            return df['ACT Symbol'].dropna().astype(str).tolist()
-        else:
-            return df.iloc[:, 0].dropna().astype(str).tolist()
-    except Exception as e:
-        print(f"FTP {filename} 수집 실패: {e}")
-        return []
-
-def refresh_ticker_list():
-    all_symbols = set()
+DIRECTORY_FILES = ['nasdaqlisted.txt', 'otherlisted.txt']
+# otherlisted.txt 의 Exchange 코드
+EXCHANGES = {'A': 'NYSE American', 'N': 'NYSE', 'P': 'NYSE Arca', 'Z': 'Cboe BZX', 'V': 'IEX'}
+
+def iter_listings(lines, filename):
+    """
+    나스닥 심볼 디렉터리 파일을 한 줄씩 읽어 분석 대상 보통주만 돌려줍니다.
+    파일 전체를 DataFrame 으로 만들지 않고 헤더로 컬럼 위치만 잡습니다.
+    """
+    header = None
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('File Creation Time'):  # 마지막 줄(파일 생성 정보)
+            continue
+        fields = line.split('|')
+        if header is None:
+            header = {name: i for i, name in enumerate(fields)}
+            sym_col = header.get('Symbol', header.get('ACT Symbol', 0))
+            continue
+        get = lambda col: fields[header[col]].strip() if col in header and header[col] < len(fields) else ''
+        if get('Test Issue') == 'Y':
+            continue
+        symbol = fields[sym_col].strip().upper()
+        # 데이터 정제 (기존 로직 유지: 알파벳 1~5자, 워런트/유닛/우선주 등 특수문자 심볼 제외)
+        if not (symbol.isalpha() and 1 <= len(symbol) <= 5):
+            continue
+        exchange = 'NASDAQ' if filename == 'nasdaqlisted.txt' else EXCHANGES.get(get('Exchange'), get('Exchange'))
+        yield symbol, {'name': get('Security Name'), 'exchange': exchange}
+
+def refresh_ticker_list(db_path=DB_PATH, force=False):
+    listings = {}
 
     print("미국 전체 시장 티커 수집 시작 (NASDAQ, NYSE, AMEX 등)...")
-    
-    # 1. 나스닥 상장 종목
-    nasdaq_list = get_nasdaq_ftp_data('nasdaqlisted.txt')
-    all_symbols.update(nasdaq_list)
-    print(f"- 나스닥 종목 수집 완료: {len(nasdaq_list)}개")
-
-    # 2. 기타 거래소(NYSE 등) 종목
-    other_list = get_nasdaq_ftp_data('otherlisted.txt')
-    all_symbols.update(other_list)
-    print(f"- 기타 거래소(NYSE 등) 종목 수집 완료: {len(other_list)}개")
-
-    # 3. 데이터 정제 (기존 로직 유지)
-    clean_tickers = sorted([
-        s.strip().upper() for s in all_symbols 
-        if s.strip().isalpha() and 1 <= len(s.strip()) <= 5
-        and s.strip() not in ['SYMBOL', 'FILE'] # 헤더/푸터 방어 코드
-    ])
-
-    if len(clean_tickers) > 1000:
-        with open('tickers.txt', 'w') as f:
-            for ticker in clean_tickers:
-                f.write(f"{ticker}\n")
-        print(f"✅ 전체 업데이트 완료: 총 {len(clean_tickers)}개 종목이 'tickers.txt'에 저장되었습니다.")
-        return True
-    
-    return False
+    provider = get_provider()
+    for filename in DIRECTORY_FILES:
+        try:
+            n = 0
+            for symbol, info in iter_listings(provider.symbol_directory(filename), filename):
+                listings.setdefault(symbol, info)
+                n += 1
+        except Exception as e:
+            # 한 파일이라도 실패하면 나머지 종목이 상장 폐지로 잘못 처리되므로 갱신하지 않음
+            print(f"FTP {filename} 수집 실패: {e}")
+            return False
+        print(f"- {filename} 수집 완료: {n}개")
+
+    if len(listings) <= 1000:
+        print(f"수집된 종목이 너무 적습니다 ({len(listings)}개): 갱신을 건너뜁니다.")
+        return False
+
+    conn = connect_db(db_path)
+    try:
+        # security_master 와 비교해 신규 상장 / 상장 폐지 / 심볼 변경만 반영
+        try:
+            changes = sync_universe(conn, listings, max_delist_ratio=None if force else MAX_DELIST_RATIO)
+        except ValueError as e:
+            print(f"{e} (--force 로 강제 반영)")
+            return False
+        print(f"- 신규 상장 {len(changes['listed'])}개, 상장 폐지 {len(changes['delisted'])}개, "
+              f"심볼 변경 {len(changes['renamed'])}개, 재상장 {len(changes['relisted'])}개")
+        for old, new in changes['renamed']:
+            print(f"  심볼 변경: {old} -> {new}")
+
+        # 섹터 원본은 get_universe 와 같은 TTL 로만 다시 받음 (매일 실행되므로 매번 받지 않음)
+        if sectors_stale(conn):
+            sector_map = get_sector_master_map()
+            if sector_map:
+                print(f"- 섹터 저장: {save_sectors(conn, sector_map, 'csv')}개")
+    finally:
+        # 이 스크립트가 마지막으로 DB 를 쓰고 커밋되는 경우(샤드 워크플로)에도 DELETE 모드로 남김
+        try:
+            leave_wal(conn)
+        finally:
+            conn.close()
+
+    # 예전 방식과의 호환용 내보내기 (security_master 가 비어 있을 때 get_tickers 가 사용)
+    clean_tickers = sorted(listings)
+    with open('tickers.txt', 'w') as f:
+        for ticker in clean_tickers:
+            f.write(f"{ticker}\n")
+    print(f"✅ 전체 업데이트 완료: 총 {len(clean_tickers)}개 종목 (security_master / 'tickers.txt')")
+    return True
 
 if __name__ == "__main__":
-    refresh_ticker_list()
+    parser = argparse.ArgumentParser(description="상장 종목 디렉터리로 security_master 갱신")
+    parser.add_argument('--force', action='store_true', help="상장 폐지 비율 상한을 무시하고 반영")
+    args = parser.parse_args()
+    refresh_ticker_list(force=args.force)
@@ -0,0 +1,143 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# 실행마다 한 줄(JSON)씩 누적되는 지표 파일 (GitHub Actions 에서는 actions/cache 로 보존)
+METRICS_FILE = os.environ.get('METRICS_FILE', 'run_metrics.jsonl')
+PROFILE_TOP_N = 25
+# 제외 사유별로 기록할 종목 예시 수 (전체 목록은 파일이 너무 커짐)
+DROPPED_SAMPLE = 50
+ENGINE_KEYS = ('calls', 'retries', 'throttled', 'timeouts', 'failures')
+
+
+def stats_delta(before, after):
+    return {k: after.get(k, 0) - before.get(k, 0) for k in ENGINE_KEYS}
+
+
+class RunMetrics:
+    """
+    한 번의 update_database 실행에 대한 구조화된 지표.
+    - 단계별/청크별 소요 시간과 초당 종목 수
+    - HTTP 호출/재시도/스로틀링 (FetchEngine.stats 누적)
+    - 분류별 실패 횟수와 사유별 제외 종목
+    finish() 가 METRICS_FILE 에 한 줄로 기록합니다.
+    sync_prices / refresh_fundamentals 등은 count() / failure() 만 호출하므로 None 을 넘기면 기록하지 않습니다.
+    """
+
+    def __init__(self, run_key, **params):
+        self.run_key = run_key
+        self.params = params
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.stages = {}
+        self.chunks = []
+        self.counters = Counter()
+        self.failures = Counter()
+        self.http = Counter()
+        self.dropped = {}
+        self.profile_top = None
+
+    def count(self, key, n=1):
+        self.counters[key] += n
+
+    def failure(self, category, n=1):
+        self.failures[category] += n
+
+    def drop(self, reason, symbols):
+        if not symbols:
+            return
+        entry = self.dropped.setdefault(reason, {'count': 0, 'sample': []})
+        entry['count'] += len(symbols)
+        entry['sample'].extend(symbols[:DROPPED_SAMPLE - len(entry['sample'])])
+
+    def add_engine(self, before, after):
+        """FetchEngine.stats 의 변화량을 HTTP 지표에 더하고 그 변화량을 반환합니다."""
+        delta = stats_delta(before, after)
+        self.http.update(delta)
+        return delta
+
+    @contextmanager
+    def stage(self, name):
+        """with metrics.stage('fetch') as m: ... m['symbols'] = n"""
+        m = {'symbols': 0}
+        start = time.perf_counter()
+        try:
+            yield m
+        finally:
+            seconds = time.perf_counter() - start
+            self.stages[name] = dict(m, seconds=round(seconds, 3),
+                                     symbols_per_sec=round(m['symbols'] / seconds, 2) if seconds > 0 else None)
+
+    def chunk(self, chunk_id, attempt, n_symbols, n_results, seconds, http, error=None):
+        self.chunks.append({
+            'chunk_id': chunk_id, 'attempt': attempt, 'n_symbols': n_symbols, 'n_results': n_results,
+            'seconds': round(seconds, 3), 'symbols_per_sec': round(n_symbols / seconds, 2) if seconds > 0 else None,
+            'http': http, 'error': error,
+        })
+
+    @contextmanager
+    def profile(self, enabled, path):
+        """enabled 면 블록을 cProfile 로 감싸 path 에 저장하고 누적 시간 상위 함수를 지표에 남깁니다."""
+        if not enabled:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            stats = pstats.Stats(profiler)
+            rows = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:PROFILE_TOP_N]
+            self.profile_top = {'path': path, 'top': [
+                {'func': f"{os.path.basename(fn)}:{line}({name})", 'ncalls': nc, 'tottime': round(tt, 3),
+                 'cumtime': round(ct, 3)}
+                for (fn, line, name), (_, nc, tt, ct, _) in rows
+            ]}
+            print(f"--- 프로파일 저장: {path} ---")
+
+    def to_dict(self, ok):
+        return {
+            'run_key': self.run_key,
+            'started_at': self.started_at,
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'ok': bool(ok),
+            'params': self.params,
+            'stages': self.stages,
+            'chunks': self.chunks,
+            'http': dict(self.http),
+            'counters': dict(self.counters),
+            'failures': dict(self.failures),
+            'dropped': self.dropped,
+            'profile': self.profile_top,
+        }
+
+    def finish(self, ok, path=METRICS_FILE):
+        record = self.to_dict(ok)
+        with open(path, 'a') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        summary = ', '.join(f"{k} {v['seconds']}s" for k, v in self.stages.items())
+        print(f"--- 실행 지표 기록: {path} ({summary}) | HTTP {dict(self.http)} | 실패 {dict(self.failures)} ---")
+        return record
+
+
+def load_metrics(path=METRICS_FILE, last=None):
+    """누적된 실행 지표를 읽어 최근 last 개를 반환합니다 (추세 확인용)."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return records[-last:] if last else records
+
+
+if __name__ == "__main__":
+    # 최근 실행의 처리량 추세 요약
+    for r in load_metrics(last=14):
+        fetch = r['stages'].get('fetch', {})
+        print(f"{r['started_at']} ok={r['ok']} fetch {fetch.get('seconds', '-')}s ({fetch.get('symbols_per_sec', '-')}/s) "
+              f"| HTTP {r['http'].get('calls', 0)}회, 재시도 {r['http'].get('retries', 0)}회 | 실패 {r['failures']}")
@@ -0,0 +1,274 @@
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from providers import get_provider
+
+# 상장 종목 기준 정보: 종목 id / 현재 심볼 / 이름 / 거래소 / 섹터 / 상장·상폐일
+# identifier_map 은 심볼 이력(심볼 변경 시 이전 심볼의 end_date 를 닫고 새 행을 추가)
+MASTER_COLUMNS = {'exchange': 'TEXT', 'sector': 'TEXT', 'sector_source': 'TEXT', 'sector_updated': 'TEXT',
+                  'listed_date': 'TEXT', 'delisted_date': 'TEXT'}
+# 디렉터리 파일이 잘려 들어온 경우 대량 상폐 처리를 막기 위한 상한 (활성 종목 대비)
+MAX_DELIST_RATIO = 0.1
+# security_master 에 저장된 섹터(CSV 원본)를 다시 받는 주기
+SECTOR_TTL_DAYS = int(os.environ.get('SECTOR_TTL_DAYS', 30))
+
+
+def init_security_master(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS security_master
+            (security_id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT UNIQUE, name TEXT, is_active INTEGER)
+    """)
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(security_master)")]
+    for c, t in MASTER_COLUMNS.items():
+        if c not in cols:
+            conn.execute(f"ALTER TABLE security_master ADD COLUMN {c} {t}")
+    _init_identifier_map(conn)
+    # 야간 실행의 유니버스/섹터 조회를 인덱스만으로 처리 (커버링 인덱스)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_security_master_active ON security_master (is_active, symbol, sector)")
+    conn.commit()
+
+
+def _init_identifier_map(conn):
+    """
+    예전 identifier_map(UUID 문자열 security_id, security_master 와 연결되지 않음)은
+    security_master 의 정수 id 기준으로 다시 만들고, 기존 시작일/거래소는 심볼로 이어 받습니다.
+    """
+    cols = {r[1]: r[2] for r in conn.execute("PRAGMA table_info(identifier_map)")}
+    if cols.get('security_id') == 'INTEGER':
+        return
+    if cols:
+        conn.execute("ALTER TABLE identifier_map RENAME TO identifier_map_legacy")
+    conn.execute("""
+        CREATE TABLE identifier_map (
+            security_id INTEGER NOT NULL REFERENCES security_master (security_id),
+            id_type TEXT NOT NULL DEFAULT 'ticker',
+            id_value TEXT NOT NULL,
+            exchange TEXT,
+            start_date TEXT,
+            end_date TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_identifier_map_value ON identifier_map (id_value, end_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_identifier_map_security ON identifier_map (security_id)")
+    if cols:
+        conn.execute("""
+            INSERT INTO identifier_map (security_id, id_type, id_value, exchange, start_date, end_date)
+            SELECT m.security_id, 'ticker', m.symbol, l.exchange, l.start_date, NULL
+            FROM security_master m
+            LEFT JOIN (SELECT id_value, MIN(exchange) AS exchange, MIN(start_date) AS start_date
+                       FROM identifier_map_legacy GROUP BY id_value) l ON l.id_value = m.symbol
+        """)
+        conn.execute("UPDATE security_master SET exchange = (SELECT exchange FROM identifier_map i "
+                     "WHERE i.security_id = security_master.security_id) WHERE exchange IS NULL")
+        conn.execute("DROP TABLE identifier_map_legacy")
+    else:
+        conn.execute("""
+            INSERT INTO identifier_map (security_id, id_type, id_value, exchange, start_date)
+            SELECT security_id, 'ticker', symbol, exchange, listed_date FROM security_master
+        """)
+
+
+def ensure_security_ids(conn, symbols):
+    """
+    security_master 에서 심볼별 security_id 를 찾고, 없는 심볼은 새로 등록합니다.
+    반환값: {symbol: security_id}
+    """
+    init_security_master(conn)
+    ids = dict(conn.execute("SELECT symbol, security_id FROM security_master"))
+    missing = [s for s in symbols if s not in ids]
+    if missing:
+        today = datetime.now().strftime('%Y-%m-%d')
+        conn.executemany(
+            "INSERT OR IGNORE INTO security_master (symbol, name, is_active, listed_date) VALUES (?, ?, 1, ?)",
+            [(s, s, today) for s in missing]
+        )
+        conn.executemany(
+            "INSERT INTO identifier_map (security_id, id_type, id_value, start_date) "
+            "SELECT security_id, 'ticker', symbol, ? FROM security_master WHERE symbol = ?",
+            [(today, s) for s in missing]
+        )
+        conn.commit()
+        ids = dict(conn.execute("SELECT symbol, security_id FROM security_master"))
+    return {s: ids[s] for s in symbols if s in ids}
+
+
+def load_universe(conn):
+    """상장(활성) 종목과 저장된 섹터를 {symbol: sector} 로 반환합니다 (심볼 순, 섹터 없으면 None)."""
+    init_security_master(conn)
+    return dict(conn.execute("SELECT symbol, sector FROM security_master WHERE is_active = 1 ORDER BY symbol"))
+
+
+def sectors_updated_at(conn):
+    """섹터 원본(CSV)으로 마지막으로 갱신한 날짜. 한 번도 없으면 None"""
+    return conn.execute(
+        "SELECT MAX(sector_updated) FROM security_master WHERE sector_source IS NOT NULL AND sector_source != 'info'"
+    ).fetchone()[0]
+
+
+def get_sector_master_map():
+    """
+    섹터 데이터를 여러 소스에서 로드하여 병합합니다.
+    소스 1이 실패하면 소스 2에서 찾는 방식으로 커버리지를 높입니다.
+    """
+    sector_map = {}
+    provider = get_provider()
+    
+    # --- 소스 1: 기존 GitHub 데이터 ---
+    try:
+        print("Loading Sector Map Source 1...")
+        df1 = provider.sector_table('github')
+        # 심볼 정규화 (공백 제거, 대문자, .을 -로 변경)
+        df1['Symbol'] = df1['Symbol'].astype(str).str.strip().str.upper().str.replace('.', '-', regex=False)
+        sector_map.update(dict(zip(df1['Symbol'], df1['Sector'])))
+    except Exception as e:
+        print(f"Warning: Source 1 로드 실패 ({e})")
+
+    # --- 소스 2: NASDAQ Screener 백업 데이터 (섹터 정보가 풍부함) ---
+    try:
+        print("Loading Sector Map Source 2...")
+        df2 = provider.sector_table('nasdaq_screener')
+        
+        # 컬럼명이 다를 수 있으므로 확인
+        if 'Symbol' in df2.columns and 'Sector' in df2.columns:
+            df2['Symbol'] = df2['Symbol'].astype(str).str.strip().str.upper().str.replace('.', '-', regex=False)
+            # 기존 맵에 없는 것만 추가 (Source 1 우선, 없으면 Source 2)
+            new_map = dict(zip(df2['Symbol'], df2['Sector']))
+            for sym, sec in new_map.items():
+                if sym not in sector_map or pd.isna(sector_map[sym]):
+                    if isinstance(sec, str): # 유효한 문자열 섹터만 저장
+                        sector_map[sym] = sec
+    except Exception as e:
+        print(f"Warning: Source 2 로드 실패 ({e})")
+        
+    print(f"Total Sector Map Size: {len(sector_map)} symbols")
+    return sector_map
+
+
+def sectors_stale(conn):
+    """섹터 원본(CSV)을 받은 지 SECTOR_TTL_DAYS 가 지났는지 (한 번도 받지 않았으면 True)"""
+    updated = sectors_updated_at(conn)
+    return not updated or datetime.fromisoformat(updated) + timedelta(days=SECTOR_TTL_DAYS) <= datetime.now()
+
+
+def save_sectors(conn, sector_map, source):
+    """
+    섹터를 security_master 에 저장합니다.
+    source='info' 는 yfinance 종목 정보에서 찾은 값으로, CSV 원본보다 우선하므로 CSV 갱신이 덮어쓰지 않습니다.
+    """
+    init_security_master(conn)
+    today = datetime.now().strftime('%Y-%m-%d')
+    rows = [(sec, source, today, sym) for sym, sec in sector_map.items() if isinstance(sec, str) and sec]
+    guard = "" if source == 'info' else " AND (sector_source IS NULL OR sector_source != 'info')"
+    with conn:
+        conn.executemany(
+            f"UPDATE security_master SET sector = ?, sector_source = ?, sector_updated = ? WHERE symbol = ?{guard}", rows
+        )
+    return len(rows)
+
+
+def sync_universe(conn, listings, today=None, max_delist_ratio=MAX_DELIST_RATIO):
+    """
+    디렉터리 파일에서 읽은 상장 목록 {symbol: {'name', 'exchange'}} 을 security_master 와 비교해 변경분만 반영합니다.
+    - 신규 상장: security_master / identifier_map 에 추가 (listed_date = today)
+    - 상장 폐지: is_active = 0, delisted_date 기록, 심볼 이력 종료
+    - 심볼 변경: 사라진 심볼과 새 심볼의 종목명이 같으면 같은 종목으로 보고 security_id 를 유지
+    - 재상장: 비활성 심볼이 다시 나타나면 활성화
+    max_delist_ratio 를 넘는 비율이 한 번에 사라지면(잘린 파일 등) 아무것도 바꾸지 않고 ValueError.
+    반환값: {'listed': [...], 'delisted': [...], 'renamed': [(old, new), ...], 'relisted': [...]}
+    """
+    init_security_master(conn)
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    current = {r[0]: {'security_id': r[1], 'name': r[2], 'exchange': r[3], 'is_active': r[4]} for r in conn.execute(
+        "SELECT symbol, security_id, name, exchange, is_active FROM security_master"
+    )}
+    active = {s for s, r in current.items() if r['is_active']}
+    gone = sorted(active - set(listings))
+    new = sorted(s for s in listings if s not in active)
+
+    changes = {'listed': [], 'delisted': [], 'renamed': [], 'relisted': []}
+    if max_delist_ratio is not None and active and len(gone) > len(active) * max_delist_ratio:
+        raise ValueError(f"상장 폐지 후보가 너무 많습니다 ({len(gone)} / {len(active)}): 디렉터리 파일을 확인하세요")
+
+    # 심볼 변경: 종목명이 한 쌍으로만 일치하는 경우만 인정 (흔한 이름의 오탐 방지)
+    by_name_gone, by_name_new = {}, {}
+    for s in gone:
+        by_name_gone.setdefault(_name_key(current[s]['name']), []).append(s)
+    for s in new:
+        if s not in current:
+            by_name_new.setdefault(_name_key(listings[s]['name']), []).append(s)
+    renames = [(olds[0], by_name_new[key][0]) for key, olds in by_name_gone.items()
+               if key and len(olds) == 1 and len(by_name_new.get(key, [])) == 1]
+
+    with conn:
+        for old, sym in renames:
+            sid = current[old]['security_id']
+            conn.execute("UPDATE security_master SET symbol = ?, name = ?, exchange = ? WHERE security_id = ?",
+                         (sym, listings[sym]['name'], listings[sym]['exchange'], sid))
+            _close_identifier(conn, sid, old, today)
+            _open_identifier(conn, sid, sym, listings[sym]['exchange'], today)
+            changes['renamed'].append((old, sym))
+        renamed_old = {o for o, _ in renames}
+        renamed_new = {n for _, n in renames}
+
+        for s in gone:
+            if s in renamed_old:
+                continue
+            sid = current[s]['security_id']
+            conn.execute("UPDATE security_master SET is_active = 0, delisted_date = ? WHERE security_id = ?", (today, sid))
+            _close_identifier(conn, sid, s, today)
+            changes['delisted'].append(s)
+
+        for s in new:
+            if s in renamed_new:
+                continue
+            info = listings[s]
+            if s in current:
+                sid = current[s]['security_id']
+                conn.execute("UPDATE security_master SET is_active = 1, delisted_date = NULL, name = ?, exchange = ? "
+                             "WHERE security_id = ?", (info['name'], info['exchange'], sid))
+                _open_identifier(conn, sid, s, info['exchange'], today)
+                changes['relisted'].append(s)
+            else:
+                cur = conn.execute(
+                    "INSERT INTO security_master (symbol, name, is_active, exchange, listed_date) VALUES (?, ?, 1, ?, ?)",
+                    (s, info['name'], info['exchange'], today)
+                )
+                _open_identifier(conn, cur.lastrowid, s, info['exchange'], today)
+                changes['listed'].append(s)
+
+        # 계속 상장된 종목은 이름/거래소만 갱신
+        conn.executemany(
+            "UPDATE security_master SET name = ?, exchange = ? WHERE symbol = ? AND (name IS NOT ? OR exchange IS NOT ?)",
+            [(listings[s]['name'], listings[s]['exchange'], s, listings[s]['name'], listings[s]['exchange'])
+             for s in active & set(listings)]
+        )
+    return changes
+
+
+def _name_key(name):
+    return ' '.join((name or '').upper().split())
+
+
+def _close_identifier(conn, security_id, symbol, end_date):
+    conn.execute(
+        "UPDATE identifier_map SET end_date = ? WHERE security_id = ? AND id_value = ? AND end_date IS NULL",
+        (end_date, security_id, symbol)
+    )
+
+
+def _open_identifier(conn, security_id, symbol, exchange, start_date):
+    conn.execute(
+        "INSERT INTO identifier_map (security_id, id_type, id_value, exchange, start_date) VALUES (?, 'ticker', ?, ?, ?)",
+        (security_id, symbol, exchange, start_date)
+    )
+
+
+def symbol_history(conn, symbol):
+    """심볼(현재 또는 과거)로 찾은 종목의 심볼 이력 [(symbol, exchange, start_date, end_date), ...]"""
+    return conn.execute("""
+        SELECT id_value, exchange, start_date, end_date FROM identifier_map
+        WHERE security_id IN (SELECT security_id FROM identifier_map WHERE id_value = ?)
+        ORDER BY start_date
+    """, (symbol,)).fetchall()
@@ -1,51 +1,25 @@
-import yfinance as yf
+import argparse
 import pandas as pd
-import sqlite3
-import time
 from datetime import datetime
 import os
-import requests
-import io
-
-def get_sector_master_map():
-    """
-    섹터 데이터를 여러 소스에서 로드하여 병합합니다.
-    소스 1이 실패하면 소스 2에서 찾는 방식으로 커버리지를 높입니다.
-    """
-    sector_map = {}
-    
-    # --- 소스 1: 기존 GitHub 데이터 ---
-    url1 = "https://raw.githubusercontent.com/rreichel3/US-Stock-Symbols/main/all_tickers.csv"
-    try:
-        print("Loading Sector Map Source 1...")
-        df1 = pd.read_csv(url1)
-        # 심볼 정규화 (공백 제거, 대문자, .을 -로 변경)
-        df1['Symbol'] = df1['Symbol'].astype(str).str.strip().str.upper().str.replace('.', '-', regex=False)
-        sector_map.update(dict(zip(df1['Symbol'], df1['Sector'])))
-    except Exception as e:
-        print(f"Warning: Source 1 로드 실패 ({e})")
+import subprocess
+import sys
+import time
+from price_store import get_price_conn, sync_prices, load_panel
+from fundamentals_cache import init_fundamentals, refresh_fundamentals, load_fundamentals, save_fundamentals, import_fundamentals
+from fetch_engine import FetchEngine, error_category
+from rating_engine import MIN_HISTORY, compute_ratings, trend_template
+from rating_history import append_history
+from db_store import connect_db, swap_table, compact_db, leave_wal
+from detail_store import init_detail_store, select_detail_symbols, refresh_details, quarterly_eps_growth
+from security_master import load_universe, ensure_security_ids, save_sectors, get_sector_master_map, sectors_stale
+from checkpoint import (CHECKPOINT_DB, open_checkpoint, make_run_key, completed_chunks, save_chunk, load_results,
+                        shard_tickers, shard_checkpoint_path, open_partial)
+from refresh_scheduler import FUNDAMENTALS_BUDGET, build_refresh_plan
+from run_metrics import RunMetrics
 
-    # --- 소스 2: NASDAQ Screener 백업 데이터 (섹터 정보가 풍부함) ---
-    url2 = "https://raw.githubusercontent.com/yumoxu/stock-market-analysis/master/data/nasdaq_screener.csv"
-    try:
-        print("Loading Sector Map Source 2...")
-        s = requests.get(url2).content
-        df2 = pd.read_csv(io.StringIO(s.decode('utf-8')))
-        
-        # 컬럼명이 다를 수 있으므로 확인
-        if 'Symbol' in df2.columns and 'Sector' in df2.columns:
-            df2['Symbol'] = df2['Symbol'].astype(str).str.strip().str.upper().str.replace('.', '-', regex=False)
-            # 기존 맵에 없는 것만 추가 (Source 1 우선, 없으면 Source 2)
-            new_map = dict(zip(df2['Symbol'], df2['Sector']))
-            for sym, sec in new_map.items():
-                if sym not in sector_map or pd.isna(sector_map[sym]):
-                    if isinstance(sec, str): # 유효한 문자열 섹터만 저장
-                        sector_map[sym] = sec
-    except Exception as e:
-        print(f"Warning: Source 2 로드 실패 ({e})")
-        
-    print(f"Total Sector Map Size: {len(sector_map)} symbols")
-    return sector_map
+# 체크포인트 단위 (청크마다 가격/재무 수집 후 결과를 기록)
+CHUNK_SIZE = 300
 
 def calculate_acc_dist_rating(hist):
     if len(hist) < 20: return 'C'
@@ -62,145 +36,441 @@ def get_tickers():
         with open('tickers.txt', 'r') as f:
             # 특수문자 제거 및 정규화 강화
             tickers = [line.strip().upper().replace('.', '-') for line in f if line.strip()]
-            return list(set(tickers)) # 중복 제거
+            return sorted(set(tickers)) # 중복 제거 (청크 구성이 실행마다 같도록 정렬)
     else:
         print("Warning: 'tickers.txt' not found. Using sample tickers.")
         return ['AAPL', 'NVDA', 'MSFT', 'TSLA']
 
-def fetch_info_with_retry(ticker_obj, retries=2):
+def get_universe():
     """
-    yfinance info 호출이 실패할 경우 재시도하는 헬퍼 함수
+    분석 대상 종목과 섹터 {symbol: sector} 를 security_master 에서 한 번의 인덱스 조회로 읽습니다.
+    상장 폐지(is_active = 0) 종목은 제외되어 더 이상 수집하지 않습니다.
+    security_master 가 비어 있으면 tickers.txt 로 채우고, 섹터 원본은 SECTOR_TTL_DAYS 마다만 다시 받습니다.
     """
-    for attempt in range(retries + 1):
-        try:
-            info = ticker_obj.info
-            if info and 'sector' in info:
-                return info
-            if attempt < retries:
-                time.sleep(1) # 실패 시 1초 대기 후 재시도
-        except:
-            if attempt < retries:
-                time.sleep(1)
-            else:
-                return None
-    return None
+    conn = connect_db()
+    try:
+        universe = load_universe(conn)
+        if not universe:
+            ensure_security_ids(conn, get_tickers())
+            universe = load_universe(conn)
+        if sectors_stale(conn):
+            save_sectors(conn, get_sector_master_map(), 'csv')
+            universe = load_universe(conn)
+    finally:
+        conn.close()
+    return universe
+
+def process_chunk(chunk, sector_master, price_conn, db_conn, engine, metrics=None, plan=None):
+    """
+    한 청크의 가격 동기화 -> RS / AD 계산 -> 재무 갱신을 수행하고 결과 행 목록을 반환합니다.
+    metrics(RunMetrics)가 주어지면 제외된 종목을 사유별로 기록합니다.
+    plan(RefreshPlan)이 주어지면 재무는 계획에 포함된 종목만 호출하고 나머지는 캐시를 사용합니다.
+    """
+    # 가격 동기화 (워커 풀에서 동시 다운로드, 저장소에 없는 구간만)
+    sync_prices(price_conn, chunk, engine=engine, metrics=metrics)
+
+    # 로컬 저장소의 (날짜 x 종목) 패널로 청크 전체 RS / AD 를 한 번에 계산
+    panel = load_panel(price_conn, chunk)
+    if metrics:
+        metrics.drop('no_price_data', [s for s in chunk if s not in panel['close'].columns])
+    if panel['close'].empty:
+        return []
+    ratings = compute_ratings(panel['close'], panel['volume'])
+    if metrics:
+        invalid = ratings[~ratings['valid']]
+        short = invalid['n_bars'] < MIN_HISTORY
+        metrics.drop('short_history', invalid.index[short].tolist())
+        metrics.drop('rs_unavailable', invalid.index[~short].tolist())
+    ratings = ratings[ratings['valid']]
 
-def update_database():
-    tickers = get_tickers()
-    sector_master = get_sector_master_map()
+    # 섹터 및 재무 데이터 (캐시가 만료된 종목만 동시 호출)
+    # 1차 시도: 마스터 맵에서 조회
+    sectors = {}
+    for sym in ratings.index:
+        sector = sector_master.get(sym, "Unknown")
+        sectors[sym] = "Unknown" if pd.isna(sector) else sector
+    funds, _ = refresh_fundamentals(db_conn, list(ratings.index), sectors, engine=engine, metrics=metrics,
+                                    plan=plan)
+    # 종목 정보에서 새로 찾은 섹터는 security_master 에 저장해 다음 실행부터 바로 사용
+    found = {sym: (funds.get(sym) or {}).get('sector') for sym in ratings.index if sectors[sym] == "Unknown"}
+    save_sectors(db_conn, found, 'info')
+
+    rows = []
+    for sym, r in ratings.iterrows():
+        fund = funds.get(sym) or {}
+        # API에서 섹터 정보를 찾았다면 업데이트
+        sector = fund.get('sector') or sectors[sym]
+
+        # 최종적으로도 Unknown이면 'Other' 등으로 분류하거나 유지
+        if pd.isna(sector) or sector == "nan":
+            sector = "Unknown"
+
+        eps_growth = fund.get('eps_growth')
+        rows.append({
+            'symbol': sym, 'price': float(r.price), 'rs_raw': float(r.rs_raw),
+            'ad_rating': r.ad_rating, 'roe': fund.get('roe') or 0, 'margin': fund.get('margin') or 0,
+            'sales_growth': fund.get('sales_growth') or 0, 'sector': sector,
+            'eps_growth': eps_growth * 100 if eps_growth is not None else None,
+            **{c: (None if pd.isna(r[c]) else float(r[c])) for c in TREND_COLUMNS}
+        })
+    return rows
+
+def fetch_stage(tickers, ckpt_conn, chunk_size=CHUNK_SIZE, metrics=None, profile=False, sector_master=None,
+                budget=FUNDAMENTALS_BUDGET):
+    """
+    청크 단위로 수집/계산하고 각 청크가 끝날 때마다 체크포인트에 기록합니다.
+    이미 완료된 청크(--resume)는 건너뜁니다.
+    profile 이면 청크 루프를 cProfile 로 감싸 fetch_<날짜>.prof 로 저장합니다.
+    재무 호출 대상은 refresh_scheduler 의 등급/예산(budget 회) 계획으로 정합니다.
+    """
+    metrics = metrics or RunMetrics(None)
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    done = completed_chunks(ckpt_conn)
+    pending = [cid for cid in range(len(chunks)) if cid not in done]
+    if not pending:
+        print("--- 모든 청크가 이미 완료되었습니다 ---")
+        return
+
+    if sector_master is None:
+        sector_master = get_universe()
+    price_conn = get_price_conn()
+    db_conn = connect_db()
+    init_fundamentals(db_conn)
+    engine = FetchEngine()
+    # 가격은 전 종목, 재무는 등급 순으로 예산만큼만 호출
+    plan = build_refresh_plan(db_conn, price_conn, tickers, budget=budget, metrics=metrics)
+
+    try:
+        with metrics.profile(profile, f"fetch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof"):
+            # 실패한 청크는 한 번 더 시도하고, 그래도 실패하면 --resume 시 다시 시도됨
+            for attempt in range(2):
+                failed = []
+                for cid in pending:
+                    chunk = chunks[cid]
+                    before, start = dict(engine.stats), time.perf_counter()
+                    try:
+                        rows = process_chunk(chunk, sector_master, price_conn, db_conn, engine, metrics, plan)
+                    except Exception as e:
+                        print(f"Chunk Error ({cid}): {e}")
+                        metrics.failure(f"chunk:{error_category(e)}")
+                        metrics.chunk(cid, attempt, len(chunk), 0, time.perf_counter() - start,
+                                      metrics.add_engine(before, engine.stats), error=repr(e))
+                        failed.append(cid)
+                        continue
+                    save_chunk(ckpt_conn, cid, len(chunk), rows)
+                    metrics.chunk(cid, attempt, len(chunk), len(rows), time.perf_counter() - start,
+                                  metrics.add_engine(before, engine.stats))
+                    print(f" > 청크 {cid + 1} / {len(chunks)} 완료 ({len(rows)}개 종목) | 엔진 통계: {engine.stats}")
+                pending = failed
+                if not pending:
+                    break
+    finally:
+        price_conn.close()
+        db_conn.close()
+
+TREND_COLUMNS = ['ma50', 'ma150', 'ma200', 'ma200_1m', 'high_52w', 'low_52w']
+PUBLISH_COLUMNS = ['symbol', 'price', 'rs_score', 'smr_grade', 'ad_rating', 'industry_rs_score', 'sector',
+                   'roe', 'eps_growth', *TREND_COLUMNS,
+                   'tt_above_ma150_200', 'tt_ma150_above_ma200', 'tt_ma200_rising', 'tt_ma50_above_ma150_200',
+                   'tt_above_low_30', 'tt_near_high_25', 'tt_rs_80', 'tt_above_ma50', 'tt_score', 'tt_pass']
+
+def rank_results(df):
+    """
+    전 종목 원시 지표(rs_raw, roe, margin, sales_growth, sector)로 백분위 등급을 매깁니다.
+    """
+    df = df.copy()
+    df['rs_score'] = (df['rs_raw'].rank(pct=True) * 98 + 1).fillna(0).astype(int)
     
-    all_results = []
-    chunk_size = 30 
+    df['smr_val'] = df['roe'].rank(pct=True) + df['margin'].rank(pct=True) + df['sales_growth'].rank(pct=True)
+    df['smr_grade'] = pd.qcut(df['smr_val'].rank(method='first'), 5, labels=['E', 'D', 'C', 'B', 'A'])
     
-    print(f"--- IBD SMR 강화 시스템 시작 ({datetime.now()}) ---")
-    print(f"--- 총 {len(tickers)}개 종목 분석 예정 ---")
+    # 섹터별 평균 계산 시 Unknown은 제외하거나 별도 처리 가능
+    sector_avg = df.groupby('sector')['rs_score'].mean().reset_index()
+    sector_avg['industry_rs_score'] = (sector_avg['rs_score'].rank(pct=True) * 98 + 1).fillna(0).astype(int)
+    
+    final_df = pd.merge(df, sector_avg[['sector', 'industry_rs_score']], on='sector', how='left')
+    
+    # 결측치 0 처리
+    final_df['industry_rs_score'] = final_df['industry_rs_score'].fillna(0).astype(int)
 
-    for i in range(0, len(tickers), chunk_size):
-        chunk = tickers[i:i + chunk_size]
-        try:
-            # 멀티스레드 다운로드
-            data = yf.download(chunk, period="1y", interval="1d", progress=False, group_by='ticker', threads=True)
-            
-            if data.empty:
-                print(f" > {i}~{i+chunk_size}: 데이터 없음")
-                continue
-
-            for ticker in chunk:
-                try:
-                    # 데이터 프레임 추출
-                    if len(chunk) > 1:
-                        if ticker not in data.columns.get_level_values(0): continue
-                        hist = data[ticker].dropna()
-                    else:
-                        hist = data.dropna()
-
-                    if len(hist) < 150: continue
-
-                    now_price = hist['Close'].iloc[-1]
-                    ad_rating = calculate_acc_dist_rating(hist)
-                    close = hist['Close']
-                    rs_raw = (now_price/close.iloc[-63]*2) + (now_price/close.iloc[-126]) + (now_price/close.iloc[-189]) + (now_price/close.iloc[0])
-
-                    # --- 섹터 및 재무 데이터 처리 ---
-                    # 1차 시도: 마스터 맵에서 조회
-                    sector = sector_master.get(ticker, "Unknown")
-                    roe, margin, growth = 0, 0, 0
-                    
-                    # 맵에 없거나 재무 데이터가 필요한 경우 yfinance 호출
-                    # (Unknown인 경우에만 info를 호출하거나, 재무 데이터 수집을 위해 호출)
-                    try:
-                        t_obj = yf.Ticker(ticker)
-                        # 섹터가 Unknown이면 재시도 로직을 통해 꼼꼼히 찾음
-                        if sector == "Unknown":
-                            info = fetch_info_with_retry(t_obj, retries=2)
-                        else:
-                            # 섹터를 이미 알면 한 번만 시도 (재무 데이터용)
-                            info = t_obj.info
-                        
-                        if info:
-                            roe = info.get('returnOnEquity', 0)
-                            margin = info.get('profitMargins', 0)
-                            growth = info.get('revenueGrowth', 0)
-                            
-                            # API에서 섹터 정보를 찾았다면 업데이트
-                            api_sector = info.get('sector')
-                            if api_sector:
-                                sector = api_sector
-
-                    except Exception:
-                        pass # API 실패해도 가격 데이터는 저장
-
-                    # 최종적으로도 Unknown이면 'Other' 등으로 분류하거나 유지
-                    if pd.isna(sector) or sector == "nan":
-                        sector = "Unknown"
-
-                    all_results.append({
-                        'symbol': ticker, 'price': float(now_price), 'rs_raw': rs_raw,
-                        'roe': roe if roe else 0, 'margin': margin if margin else 0,
-                        'sales_growth': growth if growth else 0,
-                        'ad_rating': ad_rating, 'sector': sector
-                    })
-                except Exception as inner_e:
-                    continue 
-
-            print(f" > {min(i+chunk_size, len(tickers))} / {len(tickers)} 완료 | 최근 섹터 예시: {sector}")
-            time.sleep(1) # 청크 간 딜레이 (API 보호)
-
-        except Exception as e:
-            print(f"Chunk Error: {e}")
-            time.sleep(5)
-
-    # 저장 로직 (이전과 동일, 안전장치 추가)
-    if all_results:
+    # 미너비니 트렌드 템플릿 (이동평균/52주 고저는 fetch 단계에서 계산됨)
+    return pd.concat([final_df, trend_template(final_df)], axis=1)
+
+def write_results(conn, final_df):
+    """
+    랭킹 결과를 스테이징 테이블에 쓴 뒤 repo_results 와 한 트랜잭션으로 교체하고 날짜별 이력(repo1_results)을 누적합니다.
+    반환값: 이력 기록 건수
+    """
+    swap_table(conn, final_df[PUBLISH_COLUMNS], 'repo_results')
+    return append_history(conn, final_df)
+
+def publish_stage(ckpt_conn, n_chunks, metrics=None):
+    """
+    체크포인트에 쌓인 결과로 랭킹을 계산해 repo_results 에 게시합니다.
+    백분위 랭킹은 전 종목 기준이므로 미완료 청크가 있으면 게시하지 않습니다.
+    """
+    metrics = metrics or RunMetrics(None)
+    missing = n_chunks - len(completed_chunks(ckpt_conn))
+    if missing > 0:
+        print(f"--- 미완료 청크 {missing}개: 게시를 건너뜁니다 (--resume 으로 재실행) ---")
+        return False
+    return publish_results(load_results(ckpt_conn), metrics)
+
+def publish_results(df, metrics=None):
+    """
+    전 종목 원시 지표(체크포인트 또는 샤드 부분 결과를 합친 것)로 랭킹을 계산해 게시합니다.
+    df 는 심볼 순으로 정렬되어 있어야 단일 실행과 같은 결과가 나옵니다 (SMR 5분위의 동순위 처리).
+    """
+    metrics = metrics or RunMetrics(None)
+    if df.empty:
+        print("--- 결과 데이터가 없습니다. ---")
+        return False
+
+    # 섹터가 여전히 Unknown인 비율 확인
+    unknown_count = len(df[df['sector'] == 'Unknown'])
+    print(f"--- 분석 완료: 총 {len(df)}개 중 Unknown 섹터: {unknown_count}개 ---")
+    metrics.count('unknown_sector', unknown_count)
+
+    try:
+        conn = connect_db()
+        with metrics.stage('ranking') as m:
+            # CANSLIM 'C': 저장된 분기 재무제표의 EPS 성장률을 우선 사용, 없으면 info 의 분기 이익 성장률
+            stmt_growth = quarterly_eps_growth(conn)
+            df['eps_growth'] = df['symbol'].map(stmt_growth).fillna(pd.to_numeric(df['eps_growth'])).astype(float)
+            final_df = rank_results(df)
+            m['symbols'] = len(final_df)
+        with metrics.stage('db_write') as m:
+            n_hist = write_results(conn, final_df)
+            m['symbols'] = len(final_df)
+        conn.close()
+        metrics.count('published', len(final_df))
+        print(f"--- DB 저장 완료 (이력 {n_hist}건 기록) ---")
+        return True
+    except Exception as db_e:
+        print(f"DB 저장 에러: {db_e}")
+        metrics.failure(f"publish:{error_category(db_e)}")
+        return False
+
+def details_stage(metrics=None):
+    """
+    게시된 결과 중 주도주 후보의 재무제표/회사 개요를 로컬 저장소에 저장합니다.
+    대시보드는 이 저장소를 먼저 읽으므로 첫 클릭에도 네트워크 호출이 없습니다.
+    """
+    metrics = metrics or RunMetrics(None)
+    conn = connect_db()
+    engine = FetchEngine()
+    try:
+        init_detail_store(conn)
+        symbols = select_detail_symbols(conn)
+        ok, failed = refresh_details(conn, symbols, engine=engine, metrics=metrics)
+        metrics.add_engine({}, engine.stats)
+        metrics.count('details_targets', len(symbols))
+        metrics.count('details_saved', ok)
+        print(f"--- 상세 데이터 저장 완료: 대상 {len(symbols)}개, 갱신 {ok}개, 실패 {failed}개 ---")
+    finally:
+        conn.close()
+    return True
+
+def release_db():
+    conn = connect_db()
+    try:
+        leave_wal(conn)
+    except Exception as e:
+        print(f"저널 모드 복원 에러: {e}")
+    finally:
+        conn.close()
+
+def compact_stage(metrics=None):
+    """
+    게시/상세 저장이 끝난 DB 의 WAL 을 본 파일에 반영하고 VACUUM 으로 빈 페이지를 정리합니다.
+    워크플로가 ibd_system.db 를 매일 커밋하므로 파일 크기를 작게 유지합니다.
+    """
+    metrics = metrics or RunMetrics(None)
+    conn = connect_db()
+    try:
+        before, free, after = compact_db(conn)
+    finally:
+        conn.close()
+    metrics.count('db_free_pages', free)
+    metrics.count('db_pages', after)
+    print(f"--- DB 정리: {before}페이지 (빈 페이지 {free}) -> {after}페이지 ---")
+
+def export_fundamentals(ckpt_conn, symbols):
+    """
+    샤드가 조회한 재무 레코드를 부분 결과 파일에도 저장합니다.
+    GitHub Actions 매트릭스처럼 샤드가 다른 러너에서 돌면 병합 단계가 이 값을 ibd_system.db 에 반영합니다.
+    """
+    db_conn = connect_db()
+    try:
+        records = load_fundamentals(db_conn, symbols)
+    finally:
+        db_conn.close()
+    init_fundamentals(ckpt_conn)
+    for record in records.values():
+        save_fundamentals(ckpt_conn, record)
+    ckpt_conn.commit()
+    return len(records)
+
+def merge_stage(universe, n_shards, chunk_size=CHUNK_SIZE, metrics=None):
+    """
+    샤드 부분 결과를 모아 전 종목 기준으로 랭킹/게시합니다.
+    모든 샤드가 같은 날, 같은 종목 목록으로 끝나 있어야 하며 하나라도 빠지면 게시하지 않습니다.
+    """
+    metrics = metrics or RunMetrics(None)
+    tickers = list(universe)
+    frames, records = [], {}
+    for shard in range(n_shards):
+        part = shard_tickers(tickers, shard, n_shards)
+        path = shard_checkpoint_path(shard, n_shards)
+        conn = open_partial(path, make_run_key(part, chunk_size))
+        if conn is None:
+            print(f"--- 샤드 {shard} 의 오늘 부분 결과가 없습니다 ({path}): 게시를 건너뜁니다 ---")
+            return False
         try:
-            df = pd.DataFrame(all_results)
-            
-            # 섹터가 여전히 Unknown인 비율 확인
-            unknown_count = len(df[df['sector'] == 'Unknown'])
-            print(f"--- 분석 완료: 총 {len(df)}개 중 Unknown 섹터: {unknown_count}개 ---")
-
-            df['rs_score'] = (df['rs_raw'].rank(pct=True) * 98 + 1).fillna(0).astype(int)
-            
-            df['smr_val'] = df['roe'].rank(pct=True) + df['margin'].rank(pct=True) + df['sales_growth'].rank(pct=True)
-            df['smr_grade'] = pd.qcut(df['smr_val'].rank(method='first'), 5, labels=['E', 'D', 'C', 'B', 'A'])
-            
-            # 섹터별 평균 계산 시 Unknown은 제외하거나 별도 처리 가능
-            sector_avg = df.groupby('sector')['rs_score'].mean().reset_index()
-            sector_avg['industry_rs_score'] = (sector_avg['rs_score'].rank(pct=True) * 98 + 1).fillna(0).astype(int)
-            
-            final_df = pd.merge(df, sector_avg[['sector', 'industry_rs_score']], on='sector', how='left')
-            
-            # 결측치 0 처리
-            final_df['industry_rs_score'] = final_df['industry_rs_score'].fillna(0).astype(int)
-
-            conn = sqlite3.connect('ibd_system.db')
-            final_df[['symbol', 'price', 'rs_score', 'smr_grade', 'ad_rating', 'industry_rs_score', 'sector']].to_sql('repo_results', conn, if_exists='replace', index=False)
+            missing = (len(part) + chunk_size - 1) // chunk_size - len(completed_chunks(conn))
+            if missing > 0:
+                print(f"--- 샤드 {shard} 미완료 청크 {missing}개: 게시를 건너뜁니다 ---")
+                return False
+            frames.append(load_results(conn))
+            records.update(load_fundamentals(conn, part))
+        finally:
             conn.close()
-            print("--- DB 저장 완료 ---")
-        except Exception as db_e:
-            print(f"DB 저장 에러: {db_e}")
-    else:
-        print("--- 결과 데이터가 없습니다. ---")
+
+    db_conn = connect_db()
+    try:
+        init_fundamentals(db_conn)
+        n_imported = import_fundamentals(db_conn, records)
+        # process_chunk 와 같은 규칙: security_master 에 섹터가 없던 종목만 종목 정보의 섹터를 저장
+        save_sectors(db_conn, {s: r['sector'] for s, r in records.items() if not universe.get(s)}, 'info')
+    finally:
+        db_conn.close()
+    metrics.count('fundamentals_imported', n_imported)
+
+    # 단일 실행의 체크포인트와 같은 순서(심볼 순)로 합쳐야 랭킹이 같음
+    df = pd.concat(frames, ignore_index=True).sort_values('symbol', ignore_index=True)
+    print(f"--- 샤드 {n_shards}개 병합: {len(df)}개 종목, 재무 {n_imported}건 반영 ---")
+    return publish_results(df, metrics)
+
+def run_workers(n_shards, resume=False, chunk_size=CHUNK_SIZE):
+    """
+    로컬에서 샤드를 프로세스 n_shards 개로 동시에 실행합니다 (--stage shard 하위 프로세스).
+    FETCH_RATE 등 요청 한도는 프로세스마다 적용됩니다.
+    반환값: 모든 샤드가 성공했는지
+    """
+    procs = []
+    for shard in range(n_shards):
+        cmd = [sys.executable, os.path.abspath(__file__), '--stage', 'shard', '--shard', str(shard),
+               '--shards', str(n_shards), '--chunk-size', str(chunk_size)]
+        if resume:
+            cmd.append('--resume')
+        procs.append(subprocess.Popen(cmd))
+    codes = [p.wait() for p in procs]
+    return all(c == 0 for c in codes)
+
+def update_database(resume=False, stage='all', chunk_size=CHUNK_SIZE, profile=False, shard=0, n_shards=1):
+    """
+    stage
+    - all: 수집 -> 게시 -> 상세 -> 정리 (n_shards > 1 이면 샤드를 로컬 프로세스로 나눠 수집한 뒤 병합)
+    - shard: 해시 분할한 shard 번 샤드만 수집해 부분 결과(checkpoint_shard*.db)로 저장
+    - merge: 샤드 부분 결과를 모아 전 종목 기준으로 게시 -> 상세 -> 정리
+    - fetch / publish / details: 단일 실행의 각 단계만
+    """
+    universe = get_universe()
+    tickers = list(universe)
+    if stage == 'shard':
+        tickers = shard_tickers(tickers, shard, n_shards)
+    
+    print(f"--- IBD SMR 강화 시스템 시작 ({datetime.now()}) ---")
+    print(f"--- 총 {len(tickers)}개 종목 분석 예정" + (f" (샤드 {shard} / {n_shards})" if stage == 'shard' else "") + " ---")
+
+    run_key = make_run_key(tickers, chunk_size)
+    n_chunks = (len(tickers) + chunk_size - 1) // chunk_size
+    # 단계별/청크별 시간, HTTP 호출, 실패 분류, 제외 종목을 run_metrics.jsonl 에 기록
+    metrics = RunMetrics(run_key, stage=stage, resume=resume, chunk_size=chunk_size,
+                         n_tickers=len(tickers), n_chunks=n_chunks, shard=shard, n_shards=n_shards)
+    # 병합/상세 단계와 로컬 다중 워커는 이 프로세스의 체크포인트를 쓰지 않음
+    ckpt_conn = None
+    if stage in ('fetch', 'shard') or (stage == 'all' and n_shards == 1):
+        path = shard_checkpoint_path(shard, n_shards) if stage == 'shard' else CHECKPOINT_DB
+        ckpt_conn = open_checkpoint(run_key, resume=resume, path=path)
+    ok = False
+    try:
+        if stage == 'publish':
+            # publish 단독 실행은 수집 결과를 지우지 않도록 읽기 전용으로 열고, 다른 실행의 체크포인트면 게시하지 않음
+            ckpt_conn = open_partial(CHECKPOINT_DB, run_key)
+            if ckpt_conn is None:
+                print(f"--- 오늘 실행({run_key})의 체크포인트가 없습니다: 게시를 건너뜁니다 (체크포인트는 그대로 둠) ---")
+                return False
+        if ckpt_conn is not None and stage in ('all', 'fetch', 'shard'):
+            with metrics.stage('fetch') as m:
+                # 재무 호출 예산은 샤드끼리 나눠 씀
+                budget = -(-FUNDAMENTALS_BUDGET // n_shards) if stage == 'shard' else FUNDAMENTALS_BUDGET
+                fetch_stage(tickers, ckpt_conn, chunk_size, metrics, profile, universe, budget)
+                m['symbols'] = sum(c['n_symbols'] for c in metrics.chunks if not c['error'])
+            if stage in ('fetch', 'shard'):
+                ok = len(completed_chunks(ckpt_conn)) == n_chunks
+                if ok and stage == 'shard':
+                    metrics.count('fundamentals_exported', export_fundamentals(ckpt_conn, tickers))
+                return ok
+        if stage == 'details':
+            with metrics.stage('details') as m:
+                ok = details_stage(metrics)
+                m['symbols'] = metrics.counters['details_targets']
+            with metrics.stage('compact'):
+                compact_stage(metrics)
+            return ok
+        if stage == 'all' and n_shards > 1:
+            with metrics.stage('shards') as m:
+                if not run_workers(n_shards, resume, chunk_size):
+                    print("--- 실패한 샤드가 있습니다 (--resume 으로 재실행) ---")
+                m['symbols'] = len(tickers)
+        with metrics.stage('publish') as m:
+            if ckpt_conn is None:
+                ok = merge_stage(universe, n_shards, chunk_size, metrics)
+            else:
+                ok = publish_stage(ckpt_conn, n_chunks, metrics)
+            m['symbols'] = metrics.counters['published']
+        if ok and stage in ('all', 'merge'):
+            # 상세 데이터 수집 실패는 게시 결과에 영향을 주지 않음
+            with metrics.stage('details') as m:
+                try:
+                    details_stage(metrics)
+                except Exception as e:
+                    print(f"상세 데이터 저장 에러: {e}")
+                    metrics.failure(f"details:{error_category(e)}")
+                m['symbols'] = metrics.counters['details_targets']
+        if ok:
+            # 정리 실패는 이미 게시된 결과에 영향을 주지 않음 (다음 실행에서 다시 정리)
+            with metrics.stage('compact'):
+                try:
+                    compact_stage(metrics)
+                except Exception as e:
+                    print(f"DB 정리 에러: {e}")
+                    metrics.failure(f"compact:{error_category(e)}")
+        return ok
+    finally:
+        if ckpt_conn is not None:
+            ckpt_conn.close()
+        if stage != 'shard':
+            # 게시에 실패해 정리 단계를 건너뛰어도 커밋되는 ibd_system.db 는 DELETE 모드로 남김
+            # (shard 는 다른 샤드 프로세스가 같은 DB 를 쓰는 중일 수 있어 제외)
+            release_db()
+        metrics.finish(ok)
 
 if __name__ == "__main__":
-    update_database()
+    parser = argparse.ArgumentParser(description="IBD 스타일 RS / SMR / AD 등급 갱신")
+    parser.add_argument('--resume', action='store_true', help="오늘 실행의 체크포인트에서 완료된 청크를 건너뜀")
+    parser.add_argument('--stage', choices=['all', 'fetch', 'publish', 'details', 'shard', 'merge'], default='all',
+                        help="fetch: 수집/계산만, publish: 체크포인트로 랭킹/게시만, details: 주도주 상세 데이터 저장만, "
+                             "shard: --shard 번 샤드만 수집, merge: 샤드 부분 결과를 모아 게시")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--profile', action='store_true', help="fetch 청크 루프를 cProfile 로 측정해 .prof 파일로 저장")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="해시 분할 샤드 수 (stage all 에서 2 이상이면 로컬 프로세스로 동시 실행)")
+    parser.add_argument('--shard', type=int, default=0, help="--stage shard 에서 실행할 샤드 번호 (0부터)")
+    args = parser.parse_args()
+    if not 0 <= args.shard < args.shards:
+        parser.error("--shard 는 0 이상 --shards 미만이어야 합니다")
+    ok = update_database(resume=args.resume, stage=args.stage, chunk_size=args.chunk_size, profile=args.profile,
+                         shard=args.shard, n_shards=args.shards)
+    sys.exit(0 if ok else 1)